@@ -1,11 +1,23 @@
-from flask import Flask, request, jsonify, send_file, render_template, session, redirect, url_for
+from flask import Flask, Response, g, request, jsonify, send_file, render_template, session, redirect, url_for, stream_with_context
 from flask_cors import CORS
 import io
-from datetime import datetime
+from datetime import datetime, timezone
 import pandas as pd
 import math
-import urllib.parse
-from run_query import query_by_params
+import secrets
+import time
+from metrics import metrics_registry, PROMETHEUS_CONTENT_TYPE
+from run_query import cached_query_by_params
+from query_cache import query_result_cache
+from universe_snapshot import universe_snapshotter, USE_UNIVERSE_SNAPSHOT
+from columnar_json import encode_columnar
+from utils import tradingview_links
+from price_stream import price_stream_hub, PRICE_STREAM_MAX_SYMBOLS
+from price_history import default_range
+from pagination import SCREENER_FIELDS, TRADE_FIELDS, WATCHLIST_FIELDS, parse_fields, parse_limit, select_fields
+from screener_search import SEARCH_LIMIT_DEFAULT
+from watch_registry import STREAM_REF_TTL, watch_key
+from journal_summary import journal_summary_engine
 from mongodb_config import mongodb_manager
 from google_oauth import create_oauth_flow, login_required, get_user_info, verify_google_token
 from price_updater import start_price_updater, stop_price_updater, get_price_updater_stats, set_price_update_interval
@@ -27,6 +39,55 @@ os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 CORS(app)
+# Screener query behind /api/query, replaceable through the app config (benchmarks use a stub)
+app.config['QUERY_BY_PARAMS'] = cached_query_by_params
+
+# Rows per chunk of the stored query result CSV
+CSV_CHUNK_ROWS = 1000
+
+# Per-route latency, labelled with the URL rule so IDs in paths don't create new series
+HTTP_REQUEST_SECONDS = metrics_registry.histogram(
+    'http_request_seconds', 'Flask request latency until the response is returned', ['route', 'method', 'status'])
+metrics_registry.gauge('price_stream_clients', 'Connected price stream clients',
+                       lambda: price_stream_hub.get_stats()['clients'])
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    return response
+
+
+def store_query_result(df, columns, filename):
+    """Keep a query result's CSV for later download from any process, returning its short-lived ID"""
+    result_id = secrets.token_urlsafe(12)
+    mongodb_manager.save_query_result(result_id, filename, list(iter_csv_chunks(df, columns)))
+    return result_id
+
+
+def parse_page_args(allowed_fields):
+    """(cursor, limit, fields) of a listing request: ?cursor=...&limit=100&fields=symbol,price"""
+    return (
+        request.args.get('cursor') or None,
+        parse_limit(request.args.get('limit')),
+        parse_fields(request.args.get('fields'), allowed_fields)
+    )
+
+
+def iter_csv_chunks(df, columns, chunk_rows=CSV_CHUNK_ROWS):
+    """Yield a DataFrame as CSV text, chunk_rows rows at a time"""
+    for start in range(0, len(df), chunk_rows):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunk_rows].to_csv(buffer, columns=columns, index=False, header=start == 0)
+        yield buffer.getvalue()
 
 @app.route('/')
 def index():
@@ -106,14 +167,18 @@ def get_user():
 @app.route('/api/journal/trades', methods=['GET'])
 @login_required
 def get_user_trades():
-    """Get trades for the current user"""
+    """Get a page of the current user's trades, newest first"""
     user_id = session['user_id']
     try:
-        trades = mongodb_manager.get_user_trades(user_id)
+        cursor, limit, fields = parse_page_args(TRADE_FIELDS)
+        trades, next_cursor = mongodb_manager.get_user_trades_page(user_id, cursor, limit, fields)
         return jsonify({
             'success': True,
-            'trades': trades
+            'trades': trades,
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error getting user trades: {e}")
         return jsonify({'success': False, 'error': str(e)})
@@ -148,6 +213,7 @@ def save_user_trade():
         trade_id = mongodb_manager.save_trade(user_id, trade_data)
         
         if trade_id:
+            journal_summary_engine.invalidate(user_id)
             return jsonify({
                 'success': True,
                 'message': 'Trade saved successfully',
@@ -160,6 +226,28 @@ def save_user_trade():
         print(f"Error saving trade: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/journal/summary', methods=['GET'])
+@login_required
+def get_journal_summary():
+    """Journal totals and open positions at the latest cached prices"""
+    user_id = session['user_id']
+    try:
+        refresh = request.args.get('refresh', 'false').lower() in ('1', 'true', 'yes')
+        include_trades = request.args.get('include_trades', 'false').lower() in ('1', 'true', 'yes')
+        summary = journal_summary_engine.get_summary(user_id, refresh=refresh)
+        with summary.lock:
+            response = {
+                'success': True,
+                'totals': summary.totals(),
+                'positions': summary.positions()
+            }
+            if include_trades:
+                response['trades'] = summary.trades()
+        return jsonify(response)
+    except Exception as e:
+        print(f"Error building journal summary: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/journal/trades/<trade_id>', methods=['DELETE'])
 @login_required
 def delete_user_trade(trade_id):
@@ -168,6 +256,7 @@ def delete_user_trade(trade_id):
     try:
         success = mongodb_manager.delete_trade(user_id, trade_id)
         if success:
+            journal_summary_engine.invalidate(user_id)
             return jsonify({'success': True, 'message': 'Trade deleted successfully'})
         else:
             return jsonify({'success': False, 'error': 'Trade not found or could not be deleted'})
@@ -202,6 +291,7 @@ def update_user_trade(trade_id):
         
         success = mongodb_manager.update_trade(user_id, trade_id, trade_data)
         if success:
+            journal_summary_engine.invalidate(user_id)
             return jsonify({'success': True, 'message': 'Trade updated successfully'})
         else:
             return jsonify({'success': False, 'error': 'Trade not found or could not be updated'})
@@ -212,14 +302,18 @@ def update_user_trade(trade_id):
 @app.route('/api/watchlist/items', methods=['GET'])
 @login_required
 def get_user_watchlist():
-    """Get watchlist items for the current user"""
+    """Get a page of the current user's watchlist items, newest first"""
     user_id = session['user_id']
     try:
-        items = mongodb_manager.get_user_watchlist(user_id)
+        cursor, limit, fields = parse_page_args(WATCHLIST_FIELDS)
+        items, next_cursor = mongodb_manager.get_user_watchlist_page(user_id, cursor, limit, fields)
         return jsonify({
             'success': True,
-            'items': items
+            'items': items,
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error getting user watchlist: {e}")
         return jsonify({'success': False, 'error': str(e)})
@@ -312,17 +406,13 @@ def get_cached_prices():
         if not symbols:
             return jsonify({'success': False, 'error': 'No symbols provided'})
         
-        # Get cached prices from MongoDB
-        cached_prices = {}
-        for symbol in symbols:
-            price_doc = mongodb_manager.get_price_cache(symbol)
-            if price_doc:
-                cached_prices[symbol] = {
-                    'current': price_doc['current_price'],
-                    'change': price_doc['change'],
-                    'changePercent': price_doc['change_percent'],
-                    'lastUpdate': price_doc['last_update'].isoformat()
-                }
+        # Get cached prices from MongoDB in one batched query
+        found_prices = mongodb_manager.get_multiple_price_cache(symbols)
+        cached_prices = {
+            symbol: found_prices[symbol.upper()]
+            for symbol in symbols
+            if symbol.upper() in found_prices
+        }
         
         return jsonify({
             'success': True,
@@ -340,22 +430,106 @@ def update_cached_prices():
         prices = data.get('prices', {})
         
         # Update cached prices in MongoDB
-        for symbol, price_data in prices.items():
-            mongodb_manager.update_price_cache(
-                symbol=symbol,
-                current_price=price_data['current'],
-                change=price_data['change'],
-                change_percent=price_data['changePercent']
-            )
+        results = mongodb_manager.bulk_update_price_cache(prices)
         
         return jsonify({
             'success': True,
-            'message': f'Updated {len(prices)} price(s)'
+            'message': f'Updated {sum(results.values())} price(s)',
+            'results': results
         })
     except Exception as e:
         print(f"Error updating cached prices: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/prices/stream', methods=['GET'])
+def stream_prices():
+    """Stream price changes for the requested symbols as Server-Sent Events"""
+    symbols = request.args.getlist('symbols[]') or request.args.get('symbols', '').split(',')
+    symbols = sorted({s.strip().upper() for s in symbols if s.strip()})
+    if not symbols:
+        return jsonify({'success': False, 'error': 'No symbols provided'}), 400
+    if len(symbols) > PRICE_STREAM_MAX_SYMBOLS:
+        return jsonify({'success': False, 'error': f'At most {PRICE_STREAM_MAX_SYMBOLS} symbols per stream'}), 400
+    
+    # Browsers resend the last event ID in this header when they reconnect
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    def events():
+        subscription, initial, event_id = price_stream_hub.subscribe(
+            symbols, last_event_id, snapshot_loader=mongodb_manager.get_multiple_price_cache
+        )
+        # Keep streamed symbols fresh while the client is connected. The references are
+        # shared, so the leader fetches them even when a follower serves this stream, and
+        # renewed as events and heartbeats go out so they expire if this process dies
+        registry_key = watch_key('stream', secrets.token_hex(8))
+        mongodb_manager.watch_registry.set_refs(registry_key, symbols, ttl=STREAM_REF_TTL)
+        renew_at = time.monotonic() + STREAM_REF_TTL / 2
+        try:
+            for chunk in price_stream_hub.stream(subscription, initial, event_id):
+                if time.monotonic() >= renew_at:
+                    mongodb_manager.watch_registry.set_refs(registry_key, symbols, ttl=STREAM_REF_TTL)
+                    renew_at = time.monotonic() + STREAM_REF_TTL / 2
+                yield chunk
+        finally:
+            mongodb_manager.watch_registry.remove_refs(registry_key)
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def parse_utc_datetime(value):
+    """ISO 8601 query parameter as naive UTC, None if missing"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+@app.route('/api/prices/history/<symbol>', methods=['GET'])
+def get_price_history(symbol):
+    """OHLC bars for a symbol, e.g. ?resolution=5m&start=2024-12-02T14:30:00Z&end=..."""
+    try:
+        resolution = request.args.get('resolution', '1m')
+        start, end = default_range(
+            resolution,
+            parse_utc_datetime(request.args.get('start')),
+            parse_utc_datetime(request.args.get('end'))
+        )
+        bars = mongodb_manager.get_price_bars(symbol, resolution, start, end)
+        return jsonify({
+            'success': True,
+            'symbol': symbol.upper(),
+            'resolution': resolution,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'bars': [{**bar, 'start': bar['start'].isoformat()} for bar in bars]
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error getting price history: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/prices/stream/stats', methods=['GET'])
+def get_price_stream_stats():
+    """Get price stream statistics"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': price_stream_hub.get_stats()
+        })
+    except Exception as e:
+        print(f"Error getting price stream stats: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Latency histograms and counters in the Prometheus text format"""
+    return Response(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/api/prices/fetch', methods=['POST'])
 def fetch_live_prices():
     """Fetch live prices for symbols using TradingView API"""
@@ -373,14 +547,9 @@ def fetch_live_prices():
         live_prices = fetch_stock_prices(symbols)
         
         # Cache the prices
-        for symbol, price_data in live_prices.items():
-            if price_data:
-                mongodb_manager.update_price_cache(
-                    symbol=symbol,
-                    current_price=price_data['current'],
-                    change=price_data['change'],
-                    change_percent=price_data['changePercent']
-                )
+        mongodb_manager.bulk_update_price_cache(
+            {symbol: price_data for symbol, price_data in live_prices.items() if price_data}
+        )
         
         return jsonify({
             'success': True,
@@ -435,6 +604,7 @@ def set_updater_interval():
     try:
         data = request.get_json()
         seconds = data.get('seconds', 30)
+        phase = data.get('phase', 'regular')
         
         if not isinstance(seconds, int) or seconds < 10:
             return jsonify({
@@ -442,10 +612,10 @@ def set_updater_interval():
                 'error': 'Interval must be an integer >= 10 seconds'
             })
         
-        set_price_update_interval(seconds)
+        set_price_update_interval(seconds, phase)
         return jsonify({
             'success': True,
-            'message': f'Update interval set to {seconds} seconds'
+            'message': f'Update interval for {phase} set to {seconds} seconds'
         })
     except Exception as e:
         print(f"Error setting updater interval: {e}")
@@ -474,11 +644,15 @@ def api_query():
         min_adr_pct = data.get('min_adr_pct')
         filter_out_otc = data.get('filter_out_otc', True)
         bullish_candlestick_patterns_only = data.get('bullish_candlestick_patterns_only', False)
+        use_snapshot = data.get('use_snapshot', USE_UNIVERSE_SNAPSHOT)
+        # 'columnar' returns the table as per-column arrays instead of one object per row
+        response_format = data.get('format', 'records')
+        include_links = data.get('include_links', True)
         
 
         
-        # Call the existing query function
-        results = query_by_params(
+        # Call the existing query function through the result cache
+        results = app.config['QUERY_BY_PARAMS'](
             us_exchanges_only=us_exchanges_only,
             min_price=min_price,
             min_relative_volume=min_relative_volume,
@@ -487,80 +661,58 @@ def api_query():
             min_atr_pct=min_atr_pct,
             min_adr_pct=min_adr_pct,
             filter_out_otc=filter_out_otc,
-            bullish_candlestick_patterns_only=bullish_candlestick_patterns_only
+            bullish_candlestick_patterns_only=bullish_candlestick_patterns_only,
+            use_snapshot=use_snapshot
         )
         
+        # Report how old the universe snapshot behind these results is, if one was used
+        query_report = results.attrs.get('query_report', {})
+        snapshot_age = None
+        if query_report.get('snapshot_taken_at'):
+            snapshot_taken_at = datetime.fromisoformat(query_report['snapshot_taken_at'])
+            snapshot_age = round((datetime.utcnow() - snapshot_taken_at).total_seconds(), 1)
+        
         if results.empty:
             return jsonify({
                 'success': False,
                 'message': 'No symbols found matching the criteria.',
-                'count': 0
+                'count': 0,
+                'source': query_report.get('source'),
+                'snapshot_age': snapshot_age
             })
         
-        # Create TradingView links for stock names
-        def create_tradingview_link(row):
-            symbol = row['name']
-            exchange = row['exchange']
-            
-            # Map exchange names to TradingView format
-            exchange_mapping = {
-                'NASDAQ': 'NASDAQ',
-                'NYSE': 'NYSE',
-                'NYSE AMERICAN': 'NYSEAMERICAN',
-                'NYSE ARCA': 'NYSEARCA',
-                'CBOE': 'CBOE',
-                'CBOE BZX': 'CBOEBZX',
-                'CBOE BYX': 'CBOEBYX',
-                'CBOE EDGX': 'CBOEEDGX',
-                'CBOE EDGA': 'CBOEEDGA',
-                'IEX': 'IEX',
-                'OTC': 'OTC',
-                'OTC MARKETS': 'OTCMARKETS',
-                'PHILADELPHIA STOCK EXCHANGE': 'PHLX',
-                'NYSE CHICAGO': 'NYSECHICAGO',
-                'NATIONAL STOCK EXCHANGE': 'NSX',
-                'NASDAQBX': 'NASDAQBX',
-                'BATS': 'BATS',
-                'INSTINET': 'INSTINET'
-            }
-            
-            tv_exchange = exchange_mapping.get(exchange, exchange)
-            
-            # Create a more mobile-friendly TradingView link
-            # Use the symbol format that works better with mobile apps
-            # Format: EXCHANGE-SYMBOL (with hyphen, not colon)
-            symbol_pair = f"{tv_exchange}-{symbol}"
-            encoded_symbol = urllib.parse.quote(symbol_pair)
-            
-            # Use the format that works with mobile apps, including UTM parameters
-            return f"https://www.tradingview.com/symbols/{encoded_symbol}/?utm_source=androidapp&utm_medium=share"
-        
-        # Add TradingView links to the results
-        results['tradingview_link'] = results.apply(create_tradingview_link, axis=1)
+        # Add TradingView links to the results, unless the client builds them itself
+        if include_links:
+            results['tradingview_link'] = tradingview_links(results)
         
-        # Create CSV buffer (without tradingview_link column for cleaner CSV)
-        csv_export_df = results.drop(columns=['tradingview_link'])
-        csv_buffer = io.StringIO()
-        csv_export_df.to_csv(csv_buffer, index=False)
-        csv_buffer.seek(0)
-        
-        # Prepare all data (replace NaN/NA with None)
-        all_data_df = results.replace({pd.NA: None, float('nan'): None, math.nan: None})
-        all_data = all_data_df.to_dict(orient='records')
         # Remove tradingview_link column from display columns but keep it in the data for links
         display_columns = [col for col in results.columns if col != 'tradingview_link']
         
-        # Create response with CSV data and all results
+        # Keep the results server-side, the CSV (without tradingview_link) is streamed on download
+        filename = f"screener_results_{datetime.today().strftime('%Y%m%d')}.csv"
+        result_id = store_query_result(results, display_columns, filename)
+        
+        # Create response with all results and a download handle
         response_data = {
             'success': True,
             'count': len(results),
             'message': f'Found {len(results)} symbols!',
-            'csv_data': csv_buffer.getvalue(),
-            'filename': f"screener_results_{datetime.today().strftime('%Y%m%d')}.csv",
-            'data': all_data,
-            'columns': display_columns
+            'result_id': result_id,
+            'download_url': url_for('download_result_csv', result_id=result_id),
+            'filename': filename,
+            'columns': display_columns,
+            'source': query_report.get('source'),
+            'snapshot_age': snapshot_age,
+            'format': response_format
         }
         
+        if response_format == 'columnar':
+            return Response(encode_columnar(response_data, results), mimetype='application/json')
+        
+        # Prepare all data (replace NaN/NA with None)
+        all_data_df = results.replace({pd.NA: None, float('nan'): None, math.nan: None})
+        response_data['data'] = all_data_df.to_dict(orient='records')
+        
         return jsonify(response_data)
         
     except Exception as e:
@@ -570,8 +722,46 @@ def api_query():
             'count': 0
         }), 500
 
+@app.route('/api/query/cache/stats', methods=['GET'])
+def get_query_cache_stats():
+    """Get screener result cache statistics"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': query_result_cache.get_stats()
+        })
+    except Exception as e:
+        print(f"Error getting query cache stats: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/universe/snapshot/stats', methods=['GET'])
+def get_universe_snapshot_stats():
+    """Get shared universe snapshot statistics"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': universe_snapshotter.get_stats()
+        })
+    except Exception as e:
+        print(f"Error getting universe snapshot stats: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/download/<result_id>', methods=['GET'])
+def download_result_csv(result_id):
+    """Stream a stored query result as CSV"""
+    stored = mongodb_manager.get_query_result(result_id)
+    if stored is None:
+        return jsonify({'error': 'Result not found or expired, please run the query again'}), 404
+    
+    return Response(
+        iter(stored['csv_chunks']),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{stored["filename"]}"'}
+    )
+
 @app.route('/api/download', methods=['POST'])
 def download_csv():
+    """Legacy download: re-encode CSV text posted by the client"""
     try:
         data = request.get_json()
         csv_data = data.get('csv_data')
@@ -603,21 +793,24 @@ def get_screeners():
         user_id = user_info['user_id'] if user_info else None
         include_public = request.args.get('include_public', 'true').lower() == 'true'
         search_term = request.args.get('search', '')
+        cursor, limit, fields = parse_page_args(SCREENER_FIELDS)
         
         if search_term:
-            screeners = mongodb_manager.search_screeners(search_term)
-            # Apply user filtering to search results
-            if user_id:
-                screeners = [s for s in screeners if s.get('user_id') == user_id or s.get('is_public', False)]
-            elif not include_public:
-                screeners = [s for s in screeners if s.get('is_public', False)]
+            # Ranked best match first, so a single page of results
+            limit = parse_limit(request.args.get('limit'), SEARCH_LIMIT_DEFAULT)
+            screeners = mongodb_manager.search_screeners(search_term, user_id, include_public, limit)
+            screeners = [select_fields(s, fields) for s in screeners]
+            next_cursor = None
         else:
-            screeners = mongodb_manager.get_all_screeners(user_id, include_public)
+            screeners, next_cursor = mongodb_manager.get_screeners_page(user_id, include_public, cursor, limit, fields)
         
         return jsonify({
             'success': True,
-            'screeners': screeners
+            'screeners': screeners,
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -749,6 +942,8 @@ if __name__ == '__main__':
     # Start the background price updater
     print("🚀 Starting background price updater...")
     start_price_updater()
+    if USE_UNIVERSE_SNAPSHOT:
+        universe_snapshotter.start()
     
     try:
         app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,367 @@
+import asyncio
+import io
+import json
+import math
+import multiprocessing
+import random
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import requests
+from flask import jsonify
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import columnar_json
+from app import app
+from columnar_json import encode_columnar
+from mongodb_config import mongodb_manager
+from price_stream import price_stream_hub
+from run_query import get_result
+from screener_runner import ScreenerRunner
+
+
+def run_price_cache_load_test(symbol_counts=(10, 100, 1000), iterations=200):
+    """Measure GET /api/prices/cache latency against the configured storage"""
+    seed_symbols = [f"LOADTEST{i}" for i in range(max(symbol_counts))]
+    mongodb_manager.bulk_update_price_cache({
+        symbol: {'current': 100.0 + i, 'change': 1.0, 'changePercent': 1.0}
+        for i, symbol in enumerate(seed_symbols)
+    })
+    
+    client = app.test_client()
+    for count in symbol_counts:
+        query = {'symbols[]': seed_symbols[:count]}
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = client.get('/api/prices/cache', query_string=query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.get_json()['success']
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{count:>5} symbols: p50 {p50:7.2f} ms | p99 {p99:7.2f} ms")
+
+
+def _price_load_test_clients(port, mode, clients, symbol_sets, duration, poll_interval, results):
+    """Client side of run_price_stream_load_test, run in its own process"""
+    received = [0] * clients
+    deadline = time.monotonic() + duration
+    
+    def stream_client(i):
+        query = urllib.parse.urlencode({'symbols': ','.join(symbol_sets[i])})
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.settimeout(1)
+        sock.sendall(f"GET /api/prices/stream?{query} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        while time.monotonic() < deadline:
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                break
+            received[i] += chunk.count(b'event: prices')
+        sock.close()
+    
+    def poll_client(i):
+        http = requests.Session()
+        params = {'symbols[]': symbol_sets[i]}
+        next_poll = time.monotonic() + poll_interval * i / clients
+        while True:
+            time.sleep(max(0.0, next_poll - time.monotonic()))
+            if time.monotonic() >= deadline:
+                break
+            if http.get(f"http://127.0.0.1:{port}/api/prices/cache", params=params, timeout=10).ok:
+                received[i] += 1
+            next_poll += poll_interval
+    
+    target = stream_client if mode == 'stream' else poll_client
+    threads = [threading.Thread(target=target, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + 15)
+    results.put(sum(received))
+
+
+def run_price_stream_load_test(clients=500, duration=20, poll_interval=2, cycle_seconds=2, universe=200):
+    """Compare server CPU for clients streaming prices vs polling /api/prices/cache"""
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+    
+    random.seed(0)
+    symbols = [f"LOADTEST{i}" for i in range(universe)]
+    symbol_sets = [random.sample(symbols, 10) for _ in range(clients)]
+    
+    for mode in ('poll', 'stream'):
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        server.daemon_threads = True
+        results = multiprocessing.get_context('fork').Queue()
+        client_process = multiprocessing.get_context('fork').Process(
+            target=_price_load_test_clients,
+            args=(server.port, mode, clients, symbol_sets, duration, poll_interval, results)
+        )
+        client_process.start()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        
+        # Stand-in for PriceUpdater: every cycle half of the universe moves
+        stop = threading.Event()
+        def publish_cycles():
+            cycle = 0
+            while not stop.wait(cycle_seconds):
+                cycle += 1
+                prices = {
+                    symbol: {'current': 100.0 + i + (cycle if i % 2 == cycle % 2 else 0),
+                             'change': 1.0, 'changePercent': 1.0}
+                    for i, symbol in enumerate(symbols)
+                }
+                mongodb_manager.bulk_update_price_cache(prices)
+                price_stream_hub.publish({
+                    symbol: {**price, 'lastUpdate': datetime.utcnow().isoformat()}
+                    for symbol, price in prices.items()
+                })
+        publisher = threading.Thread(target=publish_cycles, daemon=True)
+        publisher.start()
+        
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        delivered = results.get()
+        cpu_seconds, wall_seconds = time.process_time() - cpu_start, time.perf_counter() - wall_start
+        client_process.join()
+        stop.set()
+        server.shutdown()
+        
+        label = f"poll every {poll_interval}s" if mode == 'poll' else 'SSE stream'
+        print(f"{clients} clients, {label:<14}: server CPU {cpu_seconds:6.2f}s over {wall_seconds:5.1f}s "
+              f"({cpu_seconds / wall_seconds * 100:5.1f}% of a core) | {delivered} responses/events delivered")
+
+
+def run_query_download_benchmark(rows=5000):
+    """Compare response sizes and peak Python memory of inline CSV vs streamed download"""
+    rng = np.random.default_rng(0)
+    fake_results = pd.DataFrame({
+        'name': [f"SYM{i}" for i in range(rows)],
+        'exchange': rng.choice(['NASDAQ', 'NYSE', 'NYSE ARCA'], rows),
+        'close': rng.random(rows) * 100,
+        'change': rng.normal(0, 3, rows),
+        'volume': rng.integers(1_000, 10_000_000, rows),
+        'SMA20': rng.random(rows) * 100,
+        'SMA20/Close': rng.random(rows) * 2,
+        'relative_volume': rng.random(rows) * 3,
+        'market_cap_basic': rng.random(rows) * 1e10,
+        'ATR%': rng.random(rows) * 10,
+        'candlestick_pattern': rng.choice(['', 'Candle.Doji', 'Candle.Hammer'], rows),
+    })
+    client = app.test_client()
+    app.config['QUERY_BY_PARAMS'] = lambda **params: fake_results.copy()
+    
+    # Old flow: CSV embedded in the JSON, posted back, returned as a file
+    tracemalloc.start()
+    start = time.perf_counter()
+    query_json = client.post('/api/query', json={}).get_json()
+    legacy_csv = io.StringIO()
+    fake_results.to_csv(legacy_csv, index=False)
+    query_json['csv_data'] = legacy_csv.getvalue()
+    legacy_query_bytes = len(json.dumps(query_json))
+    legacy_upload_bytes = len(json.dumps({'csv_data': query_json['csv_data'], 'filename': 'results.csv'}))
+    legacy_download_bytes = len(client.post('/api/download', json={'csv_data': query_json['csv_data']}).data)
+    legacy_seconds = time.perf_counter() - start
+    legacy_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    
+    # New flow: JSON without CSV, CSV streamed from the stored frame
+    tracemalloc.start()
+    start = time.perf_counter()
+    query_response = client.post('/api/query', json={})
+    query_bytes = len(query_response.data)
+    download = client.get(query_response.get_json()['download_url'])
+    download_bytes = sum(len(chunk) for chunk in download.response)
+    new_seconds = time.perf_counter() - start
+    new_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    
+    print(f"{rows} rows")
+    print(f"inline CSV : query {legacy_query_bytes / 1024:8.0f} KiB + upload {legacy_upload_bytes / 1024:6.0f} KiB "
+          f"+ download {legacy_download_bytes / 1024:6.0f} KiB | {legacy_seconds * 1000:6.0f} ms | "
+          f"peak {legacy_peak / 2 ** 20:6.1f} MiB")
+    print(f"result ID  : query {query_bytes / 1024:8.0f} KiB + upload {0:6.0f} KiB "
+          f"+ download {download_bytes / 1024:6.0f} KiB | {new_seconds * 1000:6.0f} ms | "
+          f"peak {new_peak / 2 ** 20:6.1f} MiB")
+    print("(peak = tracemalloc peak of Python allocations during each flow)")
+
+
+def run_query_json_benchmark(rows=5000, repeat=5):
+    """Compare payload size and encode time of row-records vs columnar /api/query data"""
+    
+    rng = np.random.default_rng(0)
+    fake_results = pd.DataFrame({
+        'name': [f"SYM{i}" for i in range(rows)],
+        'exchange': pd.Categorical(rng.choice(['NASDAQ', 'NYSE', 'NYSE ARCA'], rows)),
+        'close': rng.random(rows) * 100,
+        'change': rng.normal(0, 3, rows),
+        'volume': rng.integers(1_000, 10_000_000, rows),
+        'SMA20': np.where(rng.random(rows) < 0.05, np.nan, rng.random(rows) * 100),
+        'SMA20/Close': rng.random(rows) * 2,
+        'relative_volume': rng.random(rows) * 3,
+        'market_cap_basic': np.where(rng.random(rows) < 0.1, np.nan, rng.random(rows) * 1e10),
+        'ATR%': rng.random(rows) * 10,
+        'candlestick_pattern': rng.choice(['', 'Candle.Doji', 'Candle.Hammer'], rows),
+        'tradingview_link': [f"https://www.tradingview.com/symbols/NASDAQ-SYM{i}/" for i in range(rows)],
+    })
+    
+    def encode_records():
+        all_data = fake_results.replace({pd.NA: None, float('nan'): None, math.nan: None}).to_dict(orient='records')
+        with app.app_context():
+            return jsonify({'data': all_data}).get_data()
+    
+    def timed(fn):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            payload = fn()
+            best = min(best, time.perf_counter() - start)
+        return len(payload), best
+    
+    results = [('records + jsonify', timed(encode_records)),
+               ('columnar', timed(lambda: encode_columnar({}, fake_results)))]
+    fast_encoder = columnar_json.orjson
+    if fast_encoder is not None:
+        columnar_json.orjson = None
+        results.append(('columnar (stdlib json)', timed(lambda: encode_columnar({}, fake_results))))
+        columnar_json.orjson = fast_encoder
+    
+    json.loads(encode_columnar({}, fake_results))  # must be strict JSON (no NaN literals)
+    print(f"{rows} rows x {len(fake_results.columns)} columns (best of {repeat})")
+    for label, (size, seconds) in results:
+        print(f"{label:<24}: {size / 1024:8.0f} KiB | {seconds * 1000:7.1f} ms")
+
+
+def run_trades_pagination_benchmark(n_trades=50000, page_size=100, repeat=5):
+    """Compare returning a user's whole trade history with keyset pages of it"""
+    user_id = f"benchmark-{uuid.uuid4().hex[:8]}"
+    start_time = datetime.utcnow() - timedelta(days=365)
+    symbols = ['AAPL', 'MSFT', 'NVDA', 'TSLA', 'AMZN']
+    trades = [{
+        'user_id': user_id,
+        'symbol': symbols[i % len(symbols)],
+        'type': 'buy' if i % 2 == 0 else 'sell',
+        'price': 100.0 + i % 50,
+        'quantity': 10,
+        'date': (start_time + timedelta(minutes=i)).strftime('%Y-%m-%d'),
+        'notes': 'benchmark trade with a typical note length',
+        'screenerId': None,
+        'timestamp': (start_time + timedelta(minutes=i)).isoformat(),
+        'created_at': start_time + timedelta(minutes=i)
+    } for i in range(n_trades)]
+    
+    if mongodb_manager.client is not None:
+        mongodb_manager.db.trades.insert_many(trades)
+    else:
+        if not hasattr(mongodb_manager, '_fallback_trades'):
+            mongodb_manager._fallback_trades = []
+        for i, trade in enumerate(trades):
+            trade['_id'] = f"bench{i:06d}"
+        mongodb_manager._fallback_trades.extend(trades)
+    
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    
+    def timed(fn):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            payload = fn()
+            best = min(best, time.perf_counter() - start)
+        return len(payload), best
+    
+    def full_history():
+        with app.app_context():
+            return jsonify({'success': True, 'trades': mongodb_manager.get_user_trades(user_id)}).get_data()
+    
+    def page(query):
+        return lambda: client.get(f"/api/journal/trades?{query}").get_data()
+    
+    # Cursor of a page deep into the history, 90% of the way through
+    cursor = None
+    pages_to_skip = int(n_trades * 0.9) // 1000
+    for _ in range(pages_to_skip):
+        cursor = json.loads(client.get("/api/journal/trades?limit=1000&fields=symbol"
+                                       + (f"&cursor={cursor}" if cursor else '')).get_data())['next_cursor']
+    
+    results = [
+        ('full history (before)', timed(full_history)),
+        (f'first page of {page_size}', timed(page(f"limit={page_size}"))),
+        (f'page at trade {pages_to_skip * 1000}', timed(page(f"limit={page_size}&cursor={cursor}"))),
+        ('first page, 3 fields', timed(page(f"limit={page_size}&fields=symbol,price,quantity"))),
+    ]
+    
+    if mongodb_manager.client is not None:
+        mongodb_manager.db.trades.delete_many({'user_id': user_id})
+    else:
+        mongodb_manager._fallback_trades = [t for t in mongodb_manager._fallback_trades if t['user_id'] != user_id]
+    
+    storage = 'MongoDB' if mongodb_manager.client is not None else 'in-memory fallback'
+    print(f"{n_trades} trades for one user, {storage} (best of {repeat})")
+    for label, (size, seconds) in results:
+        print(f"{label:<24}: {size / 1024:8.1f} KiB | {seconds * 1000:7.1f} ms")
+
+
+async def benchmark_concurrent_runs(n_chats=8, scan_seconds=0.5, pool_sizes=(1, 2, 4, 8)):
+    """Fire n_chats simultaneous Telegram /run results against a stubbed scan, for each worker pool size"""
+    class StubMessage:
+        async def reply_text(self, text, **kwargs):
+            return self
+
+        async def edit_text(self, text, **kwargs):
+            return self
+
+    def stub_query(**params):
+        time.sleep(scan_seconds)  # Blocking, like a real scanner download + pandas
+        return pd.DataFrame()
+
+    for pool_size in pool_sizes:
+        runner = ScreenerRunner(max_workers=pool_size)
+        conversations = [
+            get_result(
+                SimpleNamespace(message=StubMessage(), effective_chat=SimpleNamespace(id=chat_id)),
+                SimpleNamespace(user_data={}, bot=None),
+                query=stub_query,
+                runner=runner
+            )
+            for chat_id in range(n_chats)
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(*conversations)
+        elapsed = time.perf_counter() - start
+        expected = -(-n_chats // pool_size) * scan_seconds
+        print(f"pool={pool_size}: {n_chats} runs in {elapsed:.2f}s (ideal {expected:.2f}s, serial {n_chats * scan_seconds:.2f}s)")
+        assert elapsed < expected + scan_seconds, "screener runs did not scale with the pool size"
+        runner.shutdown()
+
+
+if __name__ == '__main__':
+    if '--load-test' in sys.argv:
+        run_price_cache_load_test()
+    elif '--download-benchmark' in sys.argv:
+        run_query_download_benchmark()
+    elif '--stream-load-test' in sys.argv:
+        run_price_stream_load_test()
+    elif '--json-benchmark' in sys.argv:
+        run_query_json_benchmark()
+    elif '--pagination-benchmark' in sys.argv:
+        run_trades_pagination_benchmark()
+    elif '--telegram-benchmark' in sys.argv:
+        asyncio.run(benchmark_concurrent_runs())
+    else:
+        print("Usage: python benchmarks.py --load-test | --download-benchmark | --stream-load-test | "
+              "--json-benchmark | --pagination-benchmark | --telegram-benchmark")
@@ -0,0 +1,74 @@
+import json
+from typing import Dict, List
+
+import numpy as np
+
+# orjson serializes NumPy buffers directly; the stdlib encoder is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Dtype kinds that can be encoded straight from the NumPy buffer
+NUMERIC_KINDS = 'biuf'
+
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY, default=str)
+    return json.dumps(obj, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def encode_column(series) -> bytes:
+    """
+    Encode one DataFrame column as a JSON array, NaN / NA / inf written as null
+
+    Args:
+        series: pandas Series
+
+    Returns:
+        UTF-8 JSON array
+    """
+    if series.dtype.kind in NUMERIC_KINDS and isinstance(series.dtype, np.dtype):
+        values = np.ascontiguousarray(series.to_numpy())
+        if orjson is not None:
+            # orjson writes non-finite floats as null
+            return orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY)
+        if values.dtype.kind != 'f':
+            return _dumps(values.tolist())
+        missing = ~np.isfinite(values)
+        if not missing.any():
+            return _dumps(values.tolist())
+        values = values.astype(object)
+        values[missing] = None
+        return _dumps(values.tolist())
+
+    # Strings, categoricals and nullable extension dtypes
+    return _dumps(series.to_numpy(dtype=object, na_value=None).tolist())
+
+
+def encode_columnar(fields: Dict, df, columns: List[str] = None) -> bytes:
+    """
+    Encode a response whose `data` holds a DataFrame column by column.
+
+    The table becomes {"columns": [...], "values": [[column 0], [column 1], ...]}, each
+    column encoded from its NumPy buffer, so field names aren't repeated on every row and
+    no per-row dicts are built.
+
+    Args:
+        fields: Other top-level response fields
+        df: DataFrame to encode
+        columns: Columns to include, all by default
+
+    Returns:
+        UTF-8 JSON object
+    """
+    columns = list(df.columns) if columns is None else columns
+    data = b''.join([
+        b'{"columns":', _dumps(columns),
+        b',"values":[', b','.join(encode_column(df[col]) for col in columns), b']}'
+    ])
+    head = _dumps(fields)
+    if head == b'{}':
+        return b'{"data":' + data + b'}'
+    return head[:-1] + b',"data":' + data + b'}'
@@ -26,4 +26,19 @@ class Consts:
         "NASDAQ BX",
         "BATS",
         "INSTINET"
-    ]
\ No newline at end of file
+    ]
+
+    OTC_EXCHANGES = ['OTC', 'OTC MARKETS']
+
+    BULLISH_CANDLE_COLUMNS = ['Candle.Hammer', 'Candle.Engulfing.Bullish', 'Candle.Marubozu.White']
+
+    # Always kept fresh by the price updater, on top of symbols users trade or watch
+    DEFAULT_WATCHED_SYMBOLS = [
+        'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'NFLX',
+        'AMD', 'INTC', 'CRM', 'ADBE', 'PYPL', 'NKE', 'DIS', 'JPM',
+        'V', 'WMT', 'PG', 'JNJ', 'UNH', 'HD', 'MA', 'BAC', 'PFE',
+        'ABT', 'KO', 'PEP', 'TMO', 'ABBV', 'MRK', 'AVGO', 'COST',
+        'ACN', 'DHR', 'NEE', 'LLY', 'TXN', 'UNP', 'RTX', 'HON',
+        'QCOM', 'LOW', 'UPS', 'IBM', 'CAT', 'SPGI', 'GS', 'MS',
+        'AMGN', 'ISRG', 'GILD', 'T', 'DE', 'PLD', 'ADI', 'CME'
+    ]
@@ -0,0 +1,123 @@
+import os
+import threading
+from collections import defaultdict
+from typing import Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Transport configuration
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+
+DEFAULT_HEADERS = {
+    'Content-Type': 'application/json',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    # requests only decodes br when brotli is installed, so don't advertise it
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache'
+}
+
+
+class HTTPTransport:
+    """
+    Shared keep-alive HTTP transport.
+
+    Wraps a single requests.Session whose connection pools are reused across calls and
+    threads, so repeated scanner requests skip the TCP+TLS handshake.
+    """
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 timeout=HTTP_TIMEOUT, headers=None):
+        self.timeout = timeout
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS if headers is None else headers)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self._lock = threading.Lock()
+        self._requests_per_host = defaultdict(int)
+        self._errors_per_host = defaultdict(int)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pooled session"""
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors_per_host[host] += 1
+            raise
+        with self._lock:
+            self._requests_per_host[host] += 1
+        return response
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def _connections_per_host(self) -> Dict[str, int]:
+        """Number of connections each host's urllib3 pool has opened"""
+        connections = defaultdict(int)
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+            connections[host] += pool.num_connections
+        return connections
+
+    def get_stats(self) -> Dict:
+        """Per-host request, new connection and reuse counts"""
+        connections = self._connections_per_host()
+        with self._lock:
+            hosts = set(self._requests_per_host) | set(self._errors_per_host) | set(connections)
+            return {
+                host: {
+                    'requests': self._requests_per_host[host],
+                    'errors': self._errors_per_host[host],
+                    'connections_opened': connections[host],
+                    'connections_reused': max(0, self._requests_per_host[host] - connections[host]),
+                }
+                for host in hosts
+            }
+
+    def close(self):
+        self.session.close()
+
+
+# Global transport instance shared by every caller
+http_transport = HTTPTransport()
+
+
+# Test function: count handshakes against a local stub server
+if __name__ == "__main__":
+    from stub_scanner import StubScannerServer
+
+    server = StubScannerServer()
+    url = server.start()
+    n_requests = 50
+
+    for _ in range(n_requests):
+        requests.post(url, json={}, headers=DEFAULT_HEADERS).json()
+    print(f"bare requests.post: {n_requests} requests, {server.stats['connections']} handshakes")
+
+    server.reset_stats()
+    transport = HTTPTransport()
+    for _ in range(n_requests):
+        assert transport.post(url, json={}).json() == {'totalCount': 0, 'data': []}
+    print(f"pooled transport:   {n_requests} requests, {server.stats['connections']} handshakes")
+    print(f"transport stats: {transport.get_stats()}")
+
+    transport.close()
+    server.stop()
@@ -0,0 +1,317 @@
+import os
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from ttl_cache import TTLCache
+
+# Per-user summaries kept between requests
+JOURNAL_SUMMARY_CACHE_SIZE = int(os.getenv('JOURNAL_SUMMARY_CACHE_SIZE', '256'))
+JOURNAL_SUMMARY_TTL = float(os.getenv('JOURNAL_SUMMARY_TTL', '600'))  # seconds
+
+# Trade fields the summary reads
+SUMMARY_FIELDS = ('symbol', 'type', 'price', 'quantity', 'date', 'timestamp')
+
+# Trade types that open a position, and the side they open: long +1, short -1
+OPENING_SIDES = {'buy': 1, 'short': -1}
+# Trade types that close a position, and the side they close
+CLOSING_SIDES = {'sell': 1, 'cover': -1}
+
+
+def _round(value, digits=2):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+class _Ledger:
+    """
+    Everything that depends only on a user's trades: the trades as arrays, and the open
+    position, average cost and realized P&L of every symbol.
+
+    Positions use average cost, like the journal always has: a sell closes part of the
+    long at the average buy price, a cover part of the short at the average short
+    price. Longs and shorts of one symbol are tracked separately. Closing more than is
+    open only closes what is open.
+    """
+
+    def __init__(self, trades: List[Dict]):
+        df = pd.DataFrame(trades, columns=['_id', 'symbol', 'type', 'price', 'quantity', 'date', 'timestamp'])
+        df['symbol'] = df['symbol'].astype(str).str.upper()
+        df['type'] = df['type'].astype(str).str.lower()
+        df['price'] = pd.to_numeric(df['price'], errors='coerce')
+        df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
+        df = df.sort_values(['date', 'timestamp'], kind='stable', na_position='first').reset_index(drop=True)
+
+        self.trade_ids = df['_id'].astype(str).to_numpy()
+        self.codes, symbols = pd.factorize(df['symbol'], sort=True)
+        self.symbols = np.asarray(symbols, dtype=object)
+        self.price = df['price'].to_numpy(dtype=float)
+        self.quantity = df['quantity'].to_numpy(dtype=float)
+        self.types = df['type'].to_numpy(dtype=object)
+        # Side a trade's own P&L is measured on, 0 for closing trades
+        self.side = df['type'].map(OPENING_SIDES).fillna(0).to_numpy(dtype=float)
+
+        n_symbols = len(self.symbols)
+        self.long_quantity = np.zeros(n_symbols)
+        self.long_cost = np.zeros(n_symbols)  # average price of the open long
+        self.short_quantity = np.zeros(n_symbols)
+        self.short_cost = np.zeros(n_symbols)  # average price of the open short
+        self.realized_pnl = np.zeros(n_symbols)
+        self.closed_returns = []  # return percent of every closing trade
+        self._build_positions()
+
+    def _build_positions(self):
+        # Positions are path dependent (average cost, partial closes), so this walks the
+        # trades once; it runs only when the trades change, never on a price update
+        held = {}  # (code, side) -> (quantity, average cost)
+        for code, trade_type, price, quantity in zip(self.codes.tolist(), self.types.tolist(),
+                                                     self.price.tolist(), self.quantity.tolist()):
+            if not (price > 0 and quantity > 0):
+                continue
+            if trade_type in OPENING_SIDES:
+                key = (code, OPENING_SIDES[trade_type])
+                open_quantity, cost = held.get(key, (0.0, 0.0))
+                total = open_quantity + quantity
+                held[key] = (total, (cost * open_quantity + price * quantity) / total)
+            elif trade_type in CLOSING_SIDES:
+                side = CLOSING_SIDES[trade_type]
+                open_quantity, cost = held.get((code, side), (0.0, 0.0))
+                if open_quantity <= 0:
+                    continue
+                closed = min(quantity, open_quantity)
+                profit = side * (price - cost) * closed
+                self.realized_pnl[code] += profit
+                self.closed_returns.append(profit / (cost * closed) * 100)
+                remaining = open_quantity - closed
+                held[(code, side)] = (remaining, cost if remaining else 0.0)
+
+        for (code, side), (quantity, cost) in held.items():
+            if side > 0:
+                self.long_quantity[code], self.long_cost[code] = quantity, cost
+            else:
+                self.short_quantity[code], self.short_cost[code] = quantity, cost
+        self.open_quantity = self.long_quantity - self.short_quantity
+        self.closed_returns = np.asarray(self.closed_returns, dtype=float)
+
+
+class JournalSummary:
+    """A user's ledger plus the price-dependent columns, updated per changed symbol"""
+
+    def __init__(self, trades: List[Dict]):
+        self.ledger = _Ledger(trades)
+        n_trades, n_symbols = len(self.ledger.codes), len(self.ledger.symbols)
+        self.current_price = np.full(n_symbols, np.nan)
+        self.last_update = np.full(n_symbols, None, dtype=object)
+        self.trade_current = np.full(n_trades, np.nan)
+        self.trade_change_percent = np.full(n_trades, np.nan)
+        self.trade_pnl = np.full(n_trades, np.nan)
+        self.symbol_unrealized = np.zeros(n_symbols)
+        self.lock = threading.Lock()
+        self.built_at = time.time()
+        self.stats = {
+            'price_updates': 0,
+            'symbols_recomputed': 0,
+            'trades_recomputed': 0
+        }
+
+    def apply_prices(self, prices: Dict[str, Dict]) -> int:
+        """
+        Recompute the rows of symbols whose price changed since the last call
+
+        Args:
+            prices: symbol -> {'current', 'lastUpdate', ...} as returned by the price cache
+
+        Returns:
+            Number of symbols recomputed
+        """
+        ledger = self.ledger
+        new_price = np.array([
+            (prices.get(symbol) or {}).get('current', np.nan) for symbol in ledger.symbols
+        ], dtype=float)
+        changed = ~((new_price == self.current_price) | (np.isnan(new_price) & np.isnan(self.current_price)))
+        if not changed.any():
+            return 0
+
+        self.current_price[changed] = new_price[changed]
+        for code in np.flatnonzero(changed):
+            self.last_update[code] = (prices.get(ledger.symbols[code]) or {}).get('lastUpdate')
+
+        # Trades of the changed symbols only
+        rows = changed[ledger.codes]
+        current = self.current_price[ledger.codes[rows]]
+        entry = ledger.price[rows]
+        self.trade_current[rows] = current
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.trade_change_percent[rows] = (current - entry) / entry * 100
+        side = ledger.side[rows]
+        self.trade_pnl[rows] = np.where(side != 0, side * (current - entry) * ledger.quantity[rows], np.nan)
+
+        # Open positions of the changed symbols
+        current = self.current_price[changed]
+        self.symbol_unrealized[changed] = (
+            (current - ledger.long_cost[changed]) * ledger.long_quantity[changed]
+            + (ledger.short_cost[changed] - current) * ledger.short_quantity[changed]
+        )
+
+        self.stats['price_updates'] += 1
+        self.stats['symbols_recomputed'] += int(changed.sum())
+        self.stats['trades_recomputed'] += int(rows.sum())
+        return int(changed.sum())
+
+    def totals(self) -> Dict:
+        ledger = self.ledger
+        priced = ~np.isnan(self.current_price)
+        price = np.where(priced, self.current_price, 0.0)
+        unrealized = np.nansum(self.symbol_unrealized)
+        realized = ledger.realized_pnl.sum()
+        returns = ledger.closed_returns
+        long_exposure = (ledger.long_quantity * price).sum()
+        short_exposure = (ledger.short_quantity * price).sum()
+        open_symbols = (ledger.long_quantity > 0) | (ledger.short_quantity > 0)
+        return {
+            'total_trades': len(ledger.codes),
+            'symbols': len(ledger.symbols),
+            'open_positions': int(open_symbols.sum()),
+            'completed_trades': len(returns),
+            'wins': int((returns > 0).sum()),
+            'win_rate': _round((returns > 0).mean() * 100, 1) if len(returns) else 0.0,
+            'avg_return': _round(returns.mean()) if len(returns) else 0.0,
+            'realized_pnl': _round(realized),
+            'unrealized_pnl': _round(unrealized),
+            'total_pnl': _round(realized + unrealized),
+            'long_exposure': _round(long_exposure),
+            'short_exposure': _round(short_exposure),
+            'gross_exposure': _round(long_exposure + short_exposure),
+            'net_exposure': _round(long_exposure - short_exposure),
+            'unpriced_symbols': ledger.symbols[open_symbols & ~priced].tolist()
+        }
+
+    def positions(self) -> List[Dict]:
+        ledger = self.ledger
+        return [
+            {
+                'symbol': ledger.symbols[code],
+                'open_quantity': float(ledger.open_quantity[code]),
+                'long_quantity': float(ledger.long_quantity[code]),
+                'long_avg_cost': _round(ledger.long_cost[code], 4) if ledger.long_quantity[code] else None,
+                'short_quantity': float(ledger.short_quantity[code]),
+                'short_avg_cost': _round(ledger.short_cost[code], 4) if ledger.short_quantity[code] else None,
+                'current_price': _round(self.current_price[code], 4),
+                'market_value': _round(ledger.open_quantity[code] * self.current_price[code]),
+                'unrealized_pnl': _round(self.symbol_unrealized[code]),
+                'realized_pnl': _round(ledger.realized_pnl[code]),
+                'last_update': self.last_update[code]
+            }
+            for code in range(len(ledger.symbols))
+        ]
+
+    def trades(self) -> List[Dict]:
+        ledger = self.ledger
+        return [
+            {
+                '_id': trade_id,
+                'symbol': ledger.symbols[code],
+                'current_price': _round(current, 4),
+                'change_percent': _round(change_percent),
+                'unrealized_pnl': _round(pnl)
+            }
+            for trade_id, code, current, change_percent, pnl in zip(
+                ledger.trade_ids.tolist(), ledger.codes.tolist(), self.trade_current.tolist(),
+                self.trade_change_percent.tolist(), self.trade_pnl.tolist()
+            )
+        ]
+
+
+class JournalSummaryEngine:
+    """
+    Journal P&L per user, kept between requests.
+
+    A user's trades are loaded and their positions built once, then each request only
+    fetches current prices for the user's symbols and recomputes the symbols whose price
+    changed since the last request. Saving, updating or deleting a trade drops the
+    summary in this process; other processes rebuild within JOURNAL_SUMMARY_TTL or when
+    the client asks for a refresh.
+    """
+
+    def __init__(self, storage=None, maxsize=JOURNAL_SUMMARY_CACHE_SIZE, ttl=JOURNAL_SUMMARY_TTL):
+        self._storage_manager = storage
+        self._summaries = TTLCache(maxsize, ttl)
+        self._build_lock = threading.Lock()
+        self.stats = {
+            'builds': 0,
+            'incremental_requests': 0
+        }
+
+    def _storage(self):
+        # Imported lazily, like the symbol resolver, so importing this module doesn't connect
+        if self._storage_manager is None:
+            from mongodb_config import mongodb_manager
+            self._storage_manager = mongodb_manager
+        return self._storage_manager
+
+    def invalidate(self, user_id: str):
+        self._summaries.delete(user_id)
+
+    def get_summary(self, user_id: str, refresh: bool = False) -> JournalSummary:
+        """The user's summary, priced with the latest cached prices"""
+        storage = self._storage()
+        summary = None if refresh else self._summaries.get(user_id)
+        if summary is None:
+            with self._build_lock:
+                summary = None if refresh else self._summaries.get(user_id)
+                if summary is None:
+                    summary = JournalSummary(storage.get_user_trades(user_id, fields=SUMMARY_FIELDS))
+                    self._summaries.set(user_id, summary)
+                    self.stats['builds'] += 1
+        else:
+            self.stats['incremental_requests'] += 1
+
+        prices = storage.get_multiple_price_cache(summary.ledger.symbols.tolist()) if len(summary.ledger.symbols) else {}
+        with summary.lock:
+            summary.apply_prices(prices)
+        return summary
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'cached_users': len(self._summaries)}
+
+
+# Global journal summary engine instance
+journal_summary_engine = JournalSummaryEngine()
+
+
+# Compare building a summary with repricing it after one update cycle
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n_trades, n_symbols = 10000, 500
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    trades = [
+        {
+            '_id': str(i),
+            'symbol': symbols[rng.integers(n_symbols)],
+            'type': rng.choice(['buy', 'buy', 'sell', 'short', 'cover']),
+            'price': float(rng.uniform(10, 200)),
+            'quantity': int(rng.integers(1, 100)),
+            'date': f"2026-{rng.integers(1, 10):02d}-{rng.integers(1, 29):02d}",
+            'timestamp': f"{i:08d}"
+        }
+        for i in range(n_trades)
+    ]
+    prices = {symbol: {'current': float(rng.uniform(10, 200)), 'lastUpdate': 'now'} for symbol in symbols}
+
+    start = time.perf_counter()
+    summary = JournalSummary(trades)
+    summary.apply_prices(prices)
+    build = time.perf_counter() - start
+
+    for symbol in symbols[:n_symbols // 10]:
+        prices[symbol] = {'current': prices[symbol]['current'] * 1.01, 'lastUpdate': 'later'}
+    start = time.perf_counter()
+    recomputed = summary.apply_prices(prices)
+    totals = summary.totals()
+    incremental = time.perf_counter() - start
+
+    print(f"{n_trades} trades, {n_symbols} symbols: build {build * 1000:.1f} ms, "
+          f"reprice {recomputed} changed symbols + totals {incremental * 1000:.2f} ms")
+    print(totals)
@@ -0,0 +1,170 @@
+import os
+import secrets
+import socket
+import threading
+import time
+from typing import Callable, Dict
+
+# Leader election configuration
+LEADER_LEASE_TTL = float(os.getenv('LEADER_LEASE_TTL', '30'))  # seconds, failover time bound
+LEADER_LEASE_RENEW = float(os.getenv('LEADER_LEASE_RENEW', str(LEADER_LEASE_TTL / 3)))  # seconds
+
+
+def make_instance_id() -> str:
+    """Identity of this process among instances: host, PID and a random suffix"""
+    return f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+
+class MongoLease:
+    """A lease document in MongoDB; the holder must renew it before it expires"""
+    backend = 'mongodb'
+
+    def __init__(self, storage, name: str, ttl: float = LEADER_LEASE_TTL):
+        self.storage = storage
+        self.name = name
+        self.ttl = ttl
+
+    def acquire(self, owner: str) -> bool:
+        lease = self.storage.acquire_lease(self.name, owner, self.ttl)
+        return lease is not None and lease.get('owner') == owner
+
+    def release(self, owner: str):
+        self.storage.release_lease(self.name, owner)
+
+    def holder(self) -> Dict:
+        lease = self.storage.get_lease(self.name) or {}
+        expires_at = lease.get('expires_at')
+        return {
+            'owner': lease.get('owner'),
+            'expires_at': expires_at.isoformat() if expires_at else None
+        }
+
+
+class LocalLease:
+    """
+    A lease every process holds, for file and in-memory storage.
+
+    Without MongoDB each process keeps its own prices, so a follower would have nothing
+    to relay: every process updates prices for its own streams instead.
+    """
+    backend = 'local'
+
+    def __init__(self):
+        self._owner = None
+
+    def acquire(self, owner: str) -> bool:
+        self._owner = owner
+        return True
+
+    def release(self, owner: str):
+        self._owner = None
+
+    def holder(self) -> Dict:
+        return {'owner': self._owner, 'expires_at': None}
+
+
+def default_lease(storage, name: str):
+    """MongoDB lease when MongoDB is connected, otherwise no election: every process leads"""
+    if storage.client is not None:
+        return MongoLease(storage, name)
+    return LocalLease()
+
+
+class LeaderElector:
+    """
+    Keeps trying to take or renew a lease in the background.
+
+    The process holding the lease is the leader. If renewing fails, leadership is given
+    up before the lease can expire elsewhere, so two processes never lead at once;
+    if the leader dies, another process takes over within the lease TTL plus one
+    renew interval.
+    """
+
+    def __init__(self, lease, owner: str = None, ttl: float = LEADER_LEASE_TTL,
+                 renew_interval: float = LEADER_LEASE_RENEW, on_elected: Callable = None):
+        self.lease = lease
+        self.owner = owner or make_instance_id()
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.on_elected = on_elected
+        self._leader = False
+        self._renewed_at = None  # time.monotonic() of the last successful acquire
+        self._stop_event = threading.Event()
+        self.running = False
+        self.thread = None
+        self.stats = {
+            'elections': 0,
+            'demotions': 0,
+            'errors': 0
+        }
+
+    @property
+    def is_leader(self) -> bool:
+        # Stop leading on our own once the lease may have expired, even if renewals stall
+        return self._leader and time.monotonic() - self._renewed_at < self.ttl - self.renew_interval
+
+    def check(self) -> bool:
+        """Try once to take or renew the lease, returning whether we lead"""
+        try:
+            held = self.lease.acquire(self.owner)
+        except Exception as e:
+            print(f"❌ Error renewing {self.lease.backend} leader lease: {e}")
+            self.stats['errors'] += 1
+            held = None
+
+        if held:
+            self._renewed_at = time.monotonic()
+            if not self._leader:
+                self._leader = True
+                self.stats['elections'] += 1
+                print(f"👑 {self.owner} is now the price updater leader ({self.lease.backend} lease)")
+                if self.on_elected:
+                    self.on_elected()
+        elif self._leader and (held is False or not self.is_leader):
+            self._leader = False
+            self.stats['demotions'] += 1
+            print(f"⚠️ {self.owner} lost price updater leadership")
+        return self.is_leader
+
+    def start(self):
+        """Contend for the lease, then keep renewing it in a background thread"""
+        if self.running:
+            return
+        self.running = True
+        self._stop_event.clear()
+        self.check()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop renewing and hand the lease over"""
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        if self._leader:
+            try:
+                self.lease.release(self.owner)
+            except Exception as e:
+                print(f"❌ Error releasing leader lease: {e}")
+            self._leader = False
+
+    def _run(self):
+        while not self._stop_event.wait(self.renew_interval):
+            self.check()
+
+    def get_stats(self) -> Dict:
+        try:
+            holder = self.lease.holder()
+        except Exception as e:
+            holder = {'owner': None, 'expires_at': None, 'error': str(e)}
+        return {
+            **self.stats,
+            'instance_id': self.owner,
+            'is_leader': self.is_leader,
+            'leader': holder.get('owner'),
+            'lease_expires_at': holder.get('expires_at'),
+            'backend': self.lease.backend,
+            'ttl': self.ttl,
+            'renew_interval': self.renew_interval
+        }
@@ -0,0 +1,153 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterable
+
+# Logging configuration
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Libraries (werkzeug, httpx, telegram, ...) stay at their quieter level unless asked
+LOG_LEVEL_LIBRARIES = os.getenv('LOG_LEVEL_LIBRARIES', 'WARNING').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # 'text' or 'json'
+LOG_RATE_LIMIT_SECONDS = float(os.getenv('LOG_RATE_LIMIT_SECONDS', '60'))
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+_configured = False
+_level = LOG_LEVEL
+_app_loggers = set()  # names of loggers created through get_logger()
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with fields passed through `extra=` kept as keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None, use_queue: bool = True):
+    """
+    Route every logger to one stream handler
+
+    With use_queue, callers only put records on a queue and a background thread does the
+    writing, so slow stdout or log collectors never block the price updater or a request.
+
+    Args:
+        level: Log level name for this application's loggers
+        stream: Where to write, stdout by default
+        use_queue: Write from a background thread instead of the logging thread
+    """
+    global _listener, _configured, _level
+    with _lock:
+        root = logging.getLogger()
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in list(root.handlers):
+            if getattr(handler, 'configured_here', False):
+                root.removeHandler(handler)
+
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+        if use_queue:
+            log_queue = queue.SimpleQueue()
+            _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+            _listener.start()
+            handler = QueueHandler(log_queue)
+        handler.configured_here = True
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL_LIBRARIES)
+        for name in _app_loggers:
+            logging.getLogger(name).setLevel(level)
+        _configured = True
+        _level = level
+
+
+def flush_logging():
+    """Write out queued records and stop the background writer"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(flush_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Module logger, configuring logging on first use"""
+    if not _configured:
+        setup_logging()
+    logger = logging.getLogger(name)
+    with _lock:
+        _app_loggers.add(name)
+        logger.setLevel(_level)
+    return logger
+
+
+def summarize(items: Iterable, limit: int = 10) -> str:
+    """'A, B, C and 12 more' for log messages about many symbols"""
+    items = list(items)
+    shown = ', '.join(map(str, items[:limit]))
+    return f"{shown} and {len(items) - limit} more" if len(items) > limit else shown
+
+
+class RateLimitedLogger:
+    """
+    Logs a given key at most once per interval.
+
+    Meant for per-symbol messages that would otherwise repeat every update cycle; the
+    next message let through for a key says how many were dropped in between.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = LOG_RATE_LIMIT_SECONDS, max_keys: int = 10000):
+        self.logger = logger
+        self.interval = interval
+        self.max_keys = max_keys
+        self._last = OrderedDict()  # key -> (time.monotonic() of last message, suppressed since)
+        self._lock = threading.Lock()
+
+    def log(self, level: int, key, msg: str, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._last.get(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._last[key] = (last, suppressed + 1)
+                return
+            self._last[key] = (now, 0)
+            self._last.move_to_end(key)
+            while len(self._last) > self.max_keys:
+                self._last.popitem(last=False)
+        if suppressed:
+            msg += ' (%d similar messages suppressed)'
+            args = (*args, suppressed)
+        self.logger.log(level, msg, *args)
+
+    def info(self, key, msg: str, *args):
+        self.log(logging.INFO, key, msg, *args)
+
+    def warning(self, key, msg: str, *args):
+        self.log(logging.WARNING, key, msg, *args)
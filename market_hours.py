@@ -0,0 +1,147 @@
+import os
+from datetime import date, datetime, timedelta, time as dt_time
+from functools import lru_cache
+from typing import Dict, Set
+from zoneinfo import ZoneInfo
+
+MARKET_TZ = ZoneInfo('America/New_York')
+
+PRE_MARKET_OPEN = dt_time(4, 0)
+REGULAR_OPEN = dt_time(9, 30)
+REGULAR_CLOSE = dt_time(16, 0)
+EARLY_CLOSE = dt_time(13, 0)
+POST_MARKET_CLOSE = dt_time(20, 0)
+EARLY_POST_MARKET_CLOSE = dt_time(17, 0)
+
+# Trading sessions, in the order they occur during a trading day
+PRE_MARKET = 'pre'
+REGULAR = 'regular'
+POST_MARKET = 'post'
+CLOSED = 'closed'
+
+# Ad-hoc closures not covered by the rules below, comma-separated ISO dates
+EXTRA_MARKET_HOLIDAYS = {
+    date.fromisoformat(d.strip()) for d in os.getenv('EXTRA_MARKET_HOLIDAYS', '').split(',') if d.strip()
+}
+
+
+def market_now() -> datetime:
+    """Current time in the US market timezone"""
+    return datetime.now(MARKET_TZ)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th given weekday of a month, n=-1 for the last one"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _observed(day: date) -> date:
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=16)
+def market_holidays(year: int) -> Dict[date, str]:
+    """NYSE full-day holidays for a year, by observed date"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3): 'Martin Luther King Jr. Day',
+        _nth_weekday(year, 2, 0, 3): "Washington's Birthday",
+        _easter(year) - timedelta(days=2): 'Good Friday',
+        _nth_weekday(year, 5, 0, -1): 'Memorial Day',
+        _observed(date(year, 7, 4)): 'Independence Day',
+        _nth_weekday(year, 9, 0, 1): 'Labor Day',
+        _nth_weekday(year, 11, 3, 4): 'Thanksgiving Day',
+        _observed(date(year, 12, 25)): 'Christmas Day',
+    }
+    # A Saturday New Year's Day is not observed on the Friday before
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "New Year's Day"
+    if year >= 2022:
+        holidays[_observed(date(year, 6, 19))] = 'Juneteenth'
+    for day in EXTRA_MARKET_HOLIDAYS:
+        if day.year == year:
+            holidays.setdefault(day, 'Market closed')
+    return holidays
+
+
+@lru_cache(maxsize=16)
+def early_closes(year: int) -> Set[date]:
+    """Days the regular session ends at EARLY_CLOSE"""
+    holidays = market_holidays(year)
+    candidates = [
+        date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # Day after Thanksgiving
+        date(year, 12, 24),
+    ]
+    return {day for day in candidates if day.weekday() < 5 and day not in holidays}
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in market_holidays(day.year)
+
+
+def session_times(day: date):
+    """(pre-market open, regular open, regular close, post-market close) for a trading day"""
+    if day in early_closes(day.year):
+        return PRE_MARKET_OPEN, REGULAR_OPEN, EARLY_CLOSE, EARLY_POST_MARKET_CLOSE
+    return PRE_MARKET_OPEN, REGULAR_OPEN, REGULAR_CLOSE, POST_MARKET_CLOSE
+
+
+def market_session(now: datetime = None) -> str:
+    """Current US equities session: PRE_MARKET, REGULAR, POST_MARKET or CLOSED"""
+    now = (now or market_now()).astimezone(MARKET_TZ)
+    if not is_trading_day(now.date()):
+        return CLOSED
+    pre_open, regular_open, regular_close, post_close = session_times(now.date())
+    current = now.time()
+    if pre_open <= current < regular_open:
+        return PRE_MARKET
+    if regular_open <= current < regular_close:
+        return REGULAR
+    if regular_close <= current < post_close:
+        return POST_MARKET
+    return CLOSED
+
+
+def next_session_change(now: datetime = None) -> datetime:
+    """The next time market_session() changes value"""
+    now = (now or market_now()).astimezone(MARKET_TZ)
+    day = now.date()
+    # Holidays never run longer than a few days in a row
+    for _ in range(10):
+        if is_trading_day(day):
+            for boundary in session_times(day):
+                boundary_at = datetime.combine(day, boundary, tzinfo=MARKET_TZ)
+                if boundary_at > now:
+                    return boundary_at
+        day += timedelta(days=1)
+    return datetime.combine(day, PRE_MARKET_OPEN, tzinfo=MARKET_TZ)
+
+
+def is_regular_session(now: datetime = None) -> bool:
+    """Whether US equities are in their regular trading session"""
+    return market_session(now) == REGULAR
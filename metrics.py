@@ -0,0 +1,313 @@
+import functools
+from abc import ABC, abstractmethod
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Upper bounds in seconds, from a cached read to a slow scanner request
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramSeries:
+    """Bucket counts for one label combination"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> '_Timer':
+        return _Timer(self)
+
+
+class _CounterSeries:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+
+class _Timer:
+    """Context manager observing the time spent in its block"""
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series: _HistogramSeries):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.series.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _Metric(ABC):
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_series(self):
+        """Empty series for a new combination of label values"""
+
+    def labels(self, *values):
+        """Series for one combination of label values, created on first use"""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    @abstractmethod
+    def _samples(self, values, series) -> List[str]:
+        """Sample lines of one series in the text format"""
+
+    @property
+    def family_name(self) -> str:
+        """Name the HELP and TYPE lines refer to"""
+        return self.name
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.family_name} {self.documentation}", f"# TYPE {self.family_name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda item: tuple(map(str, item[0])))
+        for values, series in items:
+            lines.extend(self._samples(values, series))
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Latency histogram with fixed buckets.
+
+    Recording is a bisect and three additions under a per-series lock, about a
+    microsecond, so it stays on in production. Buckets are made cumulative only when
+    the metrics are rendered.
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value: float, *values):
+        self.labels(*values).observe(value)
+
+    def time(self, *values) -> _Timer:
+        """Time a block: `with histogram.time('label'):`"""
+        return _Timer(self.labels(*values))
+
+    def _samples(self, values, series) -> List[str]:
+        with series.lock:
+            counts, total, count = list(series.counts), series.sum, series.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_number(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter(_Metric):
+    """Samples are exposed as <name>_total, which the text format wants in HELP and TYPE too"""
+    type_name = 'counter'
+
+    @property
+    def family_name(self) -> str:
+        return f"{self.name}_total"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def inc(self, *values, amount: float = 1):
+        self.labels(*values).inc(amount)
+
+    def _samples(self, values, series) -> List[str]:
+        return [f"{self.family_name}{_format_labels(self.labelnames, values)} {_format_number(series.value)}"]
+
+
+class Gauge(_Metric):
+    """Value read from a callback when the metrics are rendered, e.g. a queue length"""
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def _new_series(self):
+        raise TypeError(f"Gauge {self.name} is read from its callback and has no labelled series")
+
+    def _samples(self, values, series) -> List[str]:
+        return [f"{self.name} {_format_number(self.callback())}"]
+
+    def collect(self) -> List[str]:
+        try:
+            samples = self._samples((), None)
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", *samples]
+
+
+class MetricsRegistry:
+    """All metrics of this process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, documentation, callback))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+def timed(histogram: Histogram, *values):
+    """Decorator recording every call's duration, whether it returns or raises"""
+    def decorator(func):
+        series = histogram.labels(*values)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(cls, histogram: Histogram, errors: Counter = None):
+    """
+    Time every public method of a class, labelled with the method name
+
+    Args:
+        cls: Class whose methods are wrapped in place
+        histogram: Histogram with a single 'method' label
+        errors: Optional counter, same label, incremented when a method raises
+    """
+    for name, attr in list(vars(cls).items()):
+        if name.startswith('_') or not callable(attr):
+            continue
+        series = histogram.labels(name)
+
+        def wrap(func, series=series, name=name):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(name)
+                    raise
+                finally:
+                    series.observe(time.perf_counter() - start)
+            return wrapper
+
+        setattr(cls, name, wrap(attr))
+    return cls
+
+
+# Global metrics registry instance
+metrics_registry = MetricsRegistry()
+
+
+# Measure recording overhead
+if __name__ == "__main__":
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_seconds', 'Benchmark', ['op'])
+    series = histogram.labels('read')
+    n = 1_000_000
+
+    start = time.perf_counter()
+    for _ in range(n):
+        series.observe(0.003)
+    observe_ns = (time.perf_counter() - start) / n * 1e9
+
+    start = time.perf_counter()
+    for _ in range(n):
+        with histogram.time('read'):
+            pass
+    timer_ns = (time.perf_counter() - start) / n * 1e9
+
+    noop = timed(histogram, 'noop')(lambda: None)
+    start = time.perf_counter()
+    for _ in range(n):
+        noop()
+    decorated_ns = (time.perf_counter() - start) / n * 1e9
+
+    print(f"observe: {observe_ns:.0f} ns, timed block: {timer_ns:.0f} ns, decorated call: {decorated_ns:.0f} ns")
+    print(registry.render()[:400])
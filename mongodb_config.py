@@ -1,10 +1,28 @@
 import os
 import ssl
 import certifi
-from pymongo import MongoClient
-from datetime import datetime
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from datetime import datetime, timedelta
 from bson import ObjectId
 
+from logging_config import get_logger
+from metrics import instrument_methods, metrics_registry
+from pagination import (
+    PAGE_SIZE_DEFAULT, PAGE_SORT, decode_cursor, encode_cursor, keyset_filter, page_in_memory,
+    projection, select_fields
+)
+from price_history import (
+    BAR_RETENTION, MAX_BARS_PER_QUERY, PRICE_TICK_RETENTION_SECONDS, RESOLUTIONS,
+    PriceHistoryBuffer, bar_dict, bucket_start, validate_resolution
+)
+from screener_search import (
+    HIDDEN_SEARCH_PROJECTION, SEARCH_LIMIT_DEFAULT, ScreenerSearchIndex, mongo_match, mongo_score_expression,
+    query_words, search_fields
+)
+from ttl_cache import TTLCache
+from watch_registry import WatchRegistry, screener_symbols, watch_key
+
 # Storage configuration
 MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://localhost:27017/')
 MONGODB_DB = os.getenv('MONGODB_DB', 'tradingview_screener')
@@ -14,8 +32,72 @@ FORCE_FILE_STORAGE = os.getenv('FORCE_FILE_STORAGE', 'false').lower() == 'true'
 # Custom CA file path
 CUSTOM_CA_FILE = os.getenv('CUSTOM_CA_FILE', None)
 
+logger = get_logger(__name__)
+
+# In-process price cache tier in front of MongoDB
+PRICE_MEMORY_CACHE_SIZE = int(os.getenv('PRICE_MEMORY_CACHE_SIZE', '5000'))
+PRICE_MEMORY_CACHE_TTL = float(os.getenv('PRICE_MEMORY_CACHE_TTL', '30'))
+# Cached prices not updated for this long are expired by MongoDB (or the in-memory fallback)
+PRICE_CACHE_TTL_SECONDS = int(float(os.getenv('PRICE_CACHE_TTL_HOURS', '24')) * 3600)
+PRICE_FALLBACK_CACHE_SIZE = int(os.getenv('PRICE_FALLBACK_CACHE_SIZE', '20000'))
+# Query results kept for CSV download, shared between processes through MongoDB
+RESULT_STORE_TTL = int(os.getenv('RESULT_STORE_TTL', '900'))  # seconds
+RESULT_STORE_SIZE = int(os.getenv('RESULT_STORE_SIZE', '32'))  # results, fallback storage only
+
+# Fields returned by price cache reads
+PRICE_CACHE_PROJECTION = {
+    '_id': 0,
+    'symbol': 1,
+    'current_price': 1,
+    'change': 1,
+    'change_percent': 1,
+    'last_update': 1
+}
+
+# Indexes created and verified at startup: (collection, keys, options)
+INDEXES = [
+    ('screeners', [('name', 1)], {}),
+    ('screeners', [('owner', 1)], {}),
+    ('screeners', [('created_at', -1)], {}),
+    # Keyset pages of a user's documents, newest first (both $or branches of the screener listing)
+    ('screeners', [('user_id', 1), ('created_at', -1), ('_id', -1)], {}),
+    ('screeners', [('is_public', 1), ('created_at', -1), ('_id', -1)], {}),
+    # Words of name, tags and owner; prefix searches are range scans on it
+    ('screeners', [('search_words', 1)], {}),
+    ('trades', [('user_id', 1), ('created_at', -1), ('_id', -1)], {}),
+    ('watchlist', [('user_id', 1), ('created_at', -1), ('_id', -1)], {}),
+    ('symbol_exchanges', [('symbol', 1)], {'unique': True}),
+    # One document per symbol, also serves the batched $in price reads
+    ('price_cache', [('symbol', 1)], {'unique': True}),
+    # MongoDB's TTL monitor deletes prices that stopped being updated
+    ('price_cache', [('last_update', 1)], {'expireAfterSeconds': PRICE_CACHE_TTL_SECONDS}),
+    # One bar per symbol, resolution and start; also serves the range queries
+    ('price_bars', [('symbol', 1), ('resolution', 1), ('start', 1)], {'unique': True}),
+    # Bars expire at their own expires_at, daily bars have none and are kept
+    ('price_bars', [('expires_at', 1)], {'expireAfterSeconds': 0}),
+    ('query_results', [('expires_at', 1)], {'expireAfterSeconds': 0}),
+    # Price stream references expire unless renewed, document references have no expires_at
+    ('watch_refs', [('expires_at', 1)], {'expireAfterSeconds': 0}),
+]
+# MongoDB error codes for an existing index with the same keys but other options
+INDEX_OPTIONS_CONFLICT_CODES = (85, 86)
+
 class MongoDBManager:
     def __init__(self):
+        # Served before MongoDB while entries are fresher than the price update interval
+        self.price_memory_cache = TTLCache(PRICE_MEMORY_CACHE_SIZE, PRICE_MEMORY_CACHE_TTL)
+        # Symbols referenced by trades, watchlist items and screeners, loaded on first use
+        self.watch_registry = WatchRegistry(self)
+        # Price storage without MongoDB, expiring like the TTL-indexed collection
+        self._fallback_prices = TTLCache(PRICE_FALLBACK_CACHE_SIZE, PRICE_CACHE_TTL_SECONDS)
+        self._fallback_price_history = PriceHistoryBuffer()
+        # Query results without MongoDB, or when writing them to MongoDB failed
+        self._fallback_query_results = TTLCache(RESULT_STORE_SIZE, RESULT_STORE_TTL)
+        # Screener search without MongoDB
+        self._screener_search = ScreenerSearchIndex()
+        self.price_ticks_enabled = False
+        self.index_status = {}
+        
         # Check if we should force file storage (for SSL issues)
         if FORCE_FILE_STORAGE:
             print("Using file storage (FORCE_FILE_STORAGE=true) - bypassing MongoDB SSL issues")
@@ -161,9 +243,7 @@ class MongoDBManager:
             self.screeners_collection = self.db.screeners
             
             # Create indexes for better performance
-            self.screeners_collection.create_index([("name", 1)])
-            self.screeners_collection.create_index([("owner", 1)])
-            self.screeners_collection.create_index([("created_at", -1)])
+            self.ensure_indexes()
             
         except Exception as e:
             print(f"❌ MongoDB connection error: {e}")
@@ -175,6 +255,117 @@ class MongoDBManager:
             self._fallback_storage = []
             self._fallback_counter = 0
     
+    def ensure_indexes(self):
+        """
+        Create the indexes in INDEXES and verify they exist with the expected options
+        
+        Returns:
+            Dictionary mapping 'collection.index' to 'ok' or the problem found
+        """
+        status = {}
+        for collection_name, keys, options in INDEXES:
+            collection = self.db[collection_name]
+            label = f"{collection_name}.{'_'.join(f'{field}_{direction}' for field, direction in keys)}"
+            try:
+                try:
+                    collection.create_index(keys, **options)
+                except OperationFailure as e:
+                    if e.code not in INDEX_OPTIONS_CONFLICT_CODES or 'expireAfterSeconds' not in options:
+                        raise
+                    # The TTL changed since the index was created: update it in place
+                    self.db.command('collMod', collection_name, index={
+                        'keyPattern': dict(keys),
+                        'expireAfterSeconds': options['expireAfterSeconds']
+                    })
+                
+                index = next((
+                    info for info in collection.index_information().values()
+                    if [(field, int(direction)) for field, direction in info['key']] == keys
+                ), None)
+                if index is None:
+                    status[label] = 'missing'
+                else:
+                    wrong = [option for option, value in options.items() if index.get(option) != value]
+                    status[label] = f"wrong options: {', '.join(wrong)}" if wrong else 'ok'
+            except Exception as e:
+                status[label] = f"error: {e}"
+            
+            if status[label] != 'ok':
+                print(f"⚠️ Index {label}: {status[label]}")
+        
+        self.index_status = status
+        print(f"✅ Verified {sum(v == 'ok' for v in status.values())}/{len(status)} indexes")
+        self._ensure_price_ticks_collection()
+        self._backfill_screener_search()
+        return status
+
+    def _backfill_screener_search(self, batch_size=1000):
+        """Add search words to screeners saved before screener search was indexed"""
+        try:
+            missing = self.screeners_collection.find(
+                {'search_words': {'$exists': False}}, {'name': 1, 'owner': 1, 'tags': 1}
+            )
+            updated = 0
+            batch = []
+            for screener in missing:
+                batch.append(UpdateOne({'_id': screener['_id']}, {'$set': search_fields(screener)}))
+                if len(batch) >= batch_size:
+                    updated += self.screeners_collection.bulk_write(batch, ordered=False).modified_count
+                    batch = []
+            if batch:
+                updated += self.screeners_collection.bulk_write(batch, ordered=False).modified_count
+            if updated:
+                print(f"🔎 Indexed {updated} existing screeners for search")
+        except Exception as e:
+            print(f"⚠️ Could not index existing screeners for search: {e}")
+
+    def _ensure_price_ticks_collection(self):
+        """Create the raw tick time-series collection (MongoDB 5.0+), ticks are skipped without it"""
+        try:
+            if 'price_ticks' not in self.db.list_collection_names(filter={'name': 'price_ticks'}):
+                self.db.create_collection(
+                    'price_ticks',
+                    timeseries={'timeField': 'ts', 'metaField': 'symbol', 'granularity': 'seconds'},
+                    expireAfterSeconds=PRICE_TICK_RETENTION_SECONDS
+                )
+            self.price_ticks_enabled = True
+        except Exception as e:
+            print(f"⚠️ Could not create the price_ticks time-series collection, raw ticks won't be stored: {e}")
+
+    def _find_page(self, collection, query, cursor, limit, fields, hidden=None):
+        """
+        One keyset page of a collection in PAGE_SORT order
+
+        Seeks past the cursor on the index instead of skipping, so every page costs the
+        same however deep it is, and fetches one extra document to know if there is a next page.
+        """
+        if cursor:
+            created_at, doc_id = decode_cursor(cursor)
+            query = {'$and': [query, keyset_filter(created_at, ObjectId(doc_id) if ObjectId.is_valid(doc_id) else doc_id)]}
+        fields_projection = projection(fields) if fields is not None else hidden
+        docs = list(collection.find(query, fields_projection).sort(PAGE_SORT).limit(limit + 1))
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        docs = docs[:limit]
+        for doc in docs:
+            doc['_id'] = str(doc['_id'])
+            for key in ('created_at', 'updated_at'):
+                if isinstance(doc.get(key), datetime):
+                    doc[key] = doc[key].isoformat()
+        return docs, next_cursor
+
+    def _fallback_page(self, docs, cursor, limit, fields):
+        """_find_page for the in-memory fallback lists"""
+        page, next_cursor = page_in_memory(docs, cursor, limit)
+        items = []
+        for doc in page:
+            item = select_fields(doc, fields).copy()
+            item['_id'] = str(item['_id'])
+            for key in ('created_at', 'updated_at'):
+                if isinstance(item.get(key), datetime):
+                    item[key] = item[key].isoformat()
+            items.append(item)
+        return items, next_cursor
+
     def _ensure_string_dates(self, screener):
         """Helper function to ensure dates are strings"""
         screener_copy = screener.copy()
@@ -188,7 +379,10 @@ class MongoDBManager:
         """Save a screener configuration"""
         # Check if using file storage
         if hasattr(self, 'file_storage'):
-            return self.file_storage.save_screener(name, owner, tags, params, user_id, is_public)
+            return self._track_watch_refs(
+                'screener', self.file_storage.save_screener(name, owner, tags, params, user_id, is_public),
+                screener_symbols(params)
+            )
             
         screener_data = {
             'name': name,
@@ -203,14 +397,16 @@ class MongoDBManager:
         
         if self.screeners_collection is not None:
             # Use MongoDB
+            screener_data.update(search_fields(screener_data))
             result = self.screeners_collection.insert_one(screener_data)
-            return str(result.inserted_id)
+            return self._track_watch_refs('screener', str(result.inserted_id), screener_symbols(params))
         else:
             # Use fallback storage
             self._fallback_counter += 1
             screener_data['_id'] = str(self._fallback_counter)
             self._fallback_storage.append(screener_data)
-            return str(self._fallback_counter)
+            self._screener_search.add(screener_data)
+            return self._track_watch_refs('screener', str(self._fallback_counter), screener_symbols(params))
     
     def get_all_screeners(self, user_id=None, include_public=True):
         """Get all saved screeners with user filtering"""
@@ -233,7 +429,7 @@ class MongoDBManager:
                 # If no user_id and not including public, return empty
                 return []
             
-            screeners = list(self.screeners_collection.find(query).sort('created_at', -1))
+            screeners = list(self.screeners_collection.find(query, HIDDEN_SEARCH_PROJECTION).sort('created_at', -1))
             # Convert ObjectId to string for JSON serialization
             for screener in screeners:
                 screener['_id'] = str(screener['_id'])
@@ -261,6 +457,39 @@ class MongoDBManager:
             screeners.sort(key=lambda x: x['created_at'], reverse=True)
             return screeners
     
+    def get_screeners_page(self, user_id=None, include_public=True, cursor=None, limit=PAGE_SIZE_DEFAULT, fields=None):
+        """
+        One page of the screeners get_all_screeners returns, newest first
+
+        Returns:
+            (screeners, next_cursor), next_cursor None on the last page
+
+        Raises:
+            ValueError: For a malformed cursor
+        """
+        if cursor:
+            decode_cursor(cursor)
+        if hasattr(self, 'file_storage'):
+            return self._fallback_page(self.file_storage.get_all_screeners(user_id, include_public), cursor, limit, fields)
+        if self.screeners_collection is None:
+            return self._fallback_page(self.get_all_screeners(user_id, include_public), cursor, limit, fields)
+
+        query = self._screener_visibility_query(user_id, include_public)
+        if query is None:
+            return [], None
+        return self._find_page(self.screeners_collection, query, cursor, limit, fields, HIDDEN_SEARCH_PROJECTION)
+
+    def _screener_visibility_query(self, user_id, include_public):
+        """Filter for the screeners a user sees, None if there are none"""
+        if user_id:
+            return {
+                '$or': [
+                    {'user_id': user_id},
+                    {'is_public': True}
+                ]
+            } if include_public else {'user_id': user_id}
+        return {} if include_public else None
+
     def get_screener_by_id(self, screener_id):
         """Get a specific screener by ID"""
         # Check if using file storage
@@ -270,7 +499,7 @@ class MongoDBManager:
         if self.screeners_collection is not None:
             # Use MongoDB
             try:
-                screener = self.screeners_collection.find_one({'_id': ObjectId(screener_id)})
+                screener = self.screeners_collection.find_one({'_id': ObjectId(screener_id)}, HIDDEN_SEARCH_PROJECTION)
                 if screener:
                     screener['_id'] = str(screener['_id'])
                     screener['created_at'] = screener['created_at'].isoformat()
@@ -289,13 +518,13 @@ class MongoDBManager:
         """Delete a screener by ID"""
         # Check if using file storage
         if hasattr(self, 'file_storage'):
-            return self.file_storage.delete_screener(screener_id)
+            return self._untrack_watch_refs('screener', screener_id, self.file_storage.delete_screener(screener_id))
             
         if self.screeners_collection is not None:
             # Use MongoDB
             try:
                 result = self.screeners_collection.delete_one({'_id': ObjectId(screener_id)})
-                return result.deleted_count > 0
+                return self._untrack_watch_refs('screener', screener_id, result.deleted_count > 0)
             except:
                 return False
         else:
@@ -303,25 +532,42 @@ class MongoDBManager:
             for i, screener in enumerate(self._fallback_storage):
                 if screener['_id'] == screener_id:
                     del self._fallback_storage[i]
-                    return True
+                    self._screener_search.remove(screener_id)
+                    return self._untrack_watch_refs('screener', screener_id, True)
             return False
     
-    def search_screeners(self, search_term):
-        """Search screeners by name, owner, or tags"""
+    def search_screeners(self, search_term, user_id=None, include_public=True, limit=SEARCH_LIMIT_DEFAULT):
+        """
+        Screeners the user can see with a word of their name, tags or owner starting with every
+        word of the search term, best match first
+
+        Matches in the name rank above tags, tags above owner, and whole words above prefixes;
+        newer screeners come first among equal scores. Each result carries its 'score'.
+        """
         # Check if using file storage
         if hasattr(self, 'file_storage'):
-            return self.file_storage.search_screeners(search_term)
-            
+            screeners = self.file_storage.search_screeners(search_term)
+            return [
+                s for s in screeners
+                if (user_id and s.get('user_id') == user_id) or (include_public and s.get('is_public', False))
+            ][:limit]
+        
+        words = query_words(search_term)
+        if not words:
+            return []
+        
         if self.screeners_collection is not None:
-            # Use MongoDB
-            query = {
-                '$or': [
-                    {'name': {'$regex': search_term, '$options': 'i'}},
-                    {'owner': {'$regex': search_term, '$options': 'i'}},
-                    {'tags': {'$regex': search_term, '$options': 'i', '$ne': ''}}
-                ]
-            }
-            screeners = list(self.screeners_collection.find(query).sort('created_at', -1))
+            # Use MongoDB: the search_words index finds the matches, the ranking runs on them only
+            visibility = self._screener_visibility_query(user_id, include_public)
+            if visibility is None:
+                return []
+            screeners = list(self.screeners_collection.aggregate([
+                {'$match': {'$and': [visibility, mongo_match(words)]}},
+                {'$addFields': {'score': mongo_score_expression(words)}},
+                {'$sort': {'score': -1, 'created_at': -1, '_id': -1}},
+                {'$limit': limit},
+                {'$project': HIDDEN_SEARCH_PROJECTION}
+            ]))
             for screener in screeners:
                 screener['_id'] = str(screener['_id'])
                 screener['created_at'] = screener['created_at'].isoformat()
@@ -329,54 +575,77 @@ class MongoDBManager:
             return screeners
         else:
             # Use fallback storage
-            search_term_lower = search_term.lower()
-            screeners = []
-            for screener in self._fallback_storage:
-                if (search_term_lower in screener['name'].lower() or
-                    search_term_lower in screener['owner'].lower() or
-                    (screener['tags'] and search_term_lower in screener['tags'].lower())):
-                    screeners.append(self._ensure_string_dates(screener))
-            
-            # Sort by created_at (now all strings)
-            screeners.sort(key=lambda x: x['created_at'], reverse=True)
-            return screeners
+            return [
+                {**self._ensure_string_dates(screener), 'score': score}
+                for screener, score in self._screener_search.search(search_term, user_id, include_public, limit)
+            ]
 
     # Price cache methods
+    def _remember_prices(self, price_docs):
+        """Write price documents through to the in-process tier"""
+        self.price_memory_cache.set_many({
+            doc['symbol']: {k: doc[k] for k in PRICE_CACHE_PROJECTION if k in doc}
+            for doc in price_docs
+        })
+
+    def _remember_loaded_prices(self, price_docs):
+        """Cache documents read from MongoDB for whatever is left of their freshness window"""
+        now = datetime.utcnow()
+        for doc in price_docs:
+            remaining = self.price_memory_cache.ttl - (now - doc['last_update']).total_seconds()
+            self.price_memory_cache.set(doc['symbol'], doc, ttl=remaining)
+
     def get_price_cache(self, symbol):
         """Get cached price for a symbol"""
         try:
+            price_doc = self.price_memory_cache.get(symbol.upper())
+            if price_doc is not None:
+                return dict(price_doc)
+            
             if self.client is None:
-                # Use fallback storage - for now return None
-                return None
+                # Use fallback storage
+                price_doc = self._fallback_prices.get(symbol.upper())
+                return dict(price_doc) if price_doc is not None else None
             
             # Use MongoDB price cache collection
             price_collection = self.db.price_cache
-            price_doc = price_collection.find_one({'symbol': symbol.upper()})
+            price_doc = price_collection.find_one({'symbol': symbol.upper()}, PRICE_CACHE_PROJECTION)
+            if price_doc:
+                self._remember_loaded_prices([price_doc])
             return price_doc
         except Exception as e:
-            print(f"Error getting price cache for {symbol}: {e}")
+            logger.error("Error getting price cache for %s: %s", symbol, e)
             return None
 
-    def update_price_cache(self, symbol, current_price, change, change_percent):
+    def _price_cache_doc(self, symbol, current_price, change, change_percent, exchange=None):
+        """Build a price cache document"""
+        price_doc = {
+            'symbol': symbol.upper(),
+            'current_price': current_price,
+            'change': change,
+            'change_percent': change_percent,
+            'last_update': datetime.utcnow()
+        }
+        if exchange:
+            price_doc['exchange'] = exchange
+        return price_doc
+
+    def update_price_cache(self, symbol, current_price, change, change_percent, exchange=None):
         """Update cached price for a symbol"""
         try:
+            # Create or update price document
+            price_doc = self._price_cache_doc(symbol, current_price, change, change_percent, exchange)
+            self._remember_prices([price_doc])
+            
             if self.client is None:
-                # Use fallback storage - for now just log
-                print(f"Price cache update (fallback): {symbol} = ${current_price}")
+                # Use fallback storage
+                self._fallback_prices.set(price_doc['symbol'], price_doc)
+                logger.debug("Price cache update (fallback): %s = $%s", symbol, current_price)
                 return
             
             # Use MongoDB price cache collection
             price_collection = self.db.price_cache
             
-            # Create or update price document
-            price_doc = {
-                'symbol': symbol.upper(),
-                'current_price': current_price,
-                'change': change,
-                'change_percent': change_percent,
-                'last_update': datetime.utcnow()
-            }
-            
             # Upsert the document
             price_collection.update_one(
                 {'symbol': symbol.upper()},
@@ -384,27 +653,93 @@ class MongoDBManager:
                 upsert=True
             )
             
-            print(f"✅ Updated price cache for {symbol}: ${current_price}")
+            logger.debug("✅ Updated price cache for %s: $%s", symbol, current_price)
         except Exception as e:
-            print(f"Error updating price cache for {symbol}: {e}")
+            logger.error("Error updating price cache for %s: %s", symbol, e)
+
+    def bulk_update_price_cache(self, prices):
+        """
+        Update cached prices for many symbols in one unordered bulk write
+        
+        Args:
+            prices: Dictionary mapping symbols to {'current', 'change', 'changePercent'[, 'exchange']}
+            
+        Returns:
+            Dictionary mapping each symbol to True if its upsert succeeded
+        """
+        results = {}
+        operations = []
+        op_symbols = []
+        price_docs = []
+        for symbol, price_data in prices.items():
+            try:
+                price_doc = self._price_cache_doc(
+                    symbol,
+                    current_price=price_data['current'],
+                    change=price_data['change'],
+                    change_percent=price_data['changePercent'],
+                    exchange=price_data.get('exchange')
+                )
+            except (KeyError, TypeError, AttributeError):
+                results[symbol] = False
+                continue
+            operations.append(UpdateOne({'symbol': price_doc['symbol']}, {'$set': price_doc}, upsert=True))
+            op_symbols.append(symbol)
+            price_docs.append(price_doc)
+        
+        if not operations:
+            return results
+        
+        try:
+            if self.client is None:
+                # Use fallback storage
+                self._remember_prices(price_docs)
+                self._fallback_prices.set_many({doc['symbol']: doc for doc in price_docs})
+                logger.debug("Price cache bulk update (fallback): %d symbols", len(operations))
+                results.update({symbol: True for symbol in op_symbols})
+                return results
+            
+            results.update({symbol: True for symbol in op_symbols})
+            try:
+                self.db.price_cache.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', []):
+                    results[op_symbols[error['index']]] = False
+            self._remember_prices(doc for doc, symbol in zip(price_docs, op_symbols) if results[symbol])
+            
+            logger.debug("✅ Bulk updated price cache: %d/%d symbols", sum(results.values()), len(prices))
+        except Exception as e:
+            logger.error("Error bulk updating price cache: %s", e)
+            results.update({symbol: False for symbol in op_symbols})
+        
+        return results
 
     def get_multiple_price_cache(self, symbols):
         """Get cached prices for multiple symbols"""
         try:
-            if self.client is None:
-                # Use fallback storage - for now return empty dict
-                return {}
+            wanted = {s.upper() for s in symbols}
             
-            # Use MongoDB price cache collection
-            price_collection = self.db.price_cache
+            # Serve fresh entries from the in-process tier, only misses go to MongoDB
+            price_docs = list(self.price_memory_cache.get_many(wanted).values())
+            missing = wanted - {doc['symbol'] for doc in price_docs}
             
-            # Find all symbols in one query
-            cursor = price_collection.find({
-                'symbol': {'$in': [s.upper() for s in symbols]}
-            })
+            if missing and self.client is None:
+                # Use fallback storage
+                price_docs.extend(self._fallback_prices.get_many(missing).values())
+            elif missing:
+                # Use MongoDB price cache collection
+                price_collection = self.db.price_cache
+                
+                # Find all symbols in one query, fetching only the fields we return
+                loaded_docs = list(price_collection.find(
+                    {'symbol': {'$in': list(missing)}},
+                    PRICE_CACHE_PROJECTION
+                ))
+                self._remember_loaded_prices(loaded_docs)
+                price_docs.extend(loaded_docs)
             
             prices = {}
-            for doc in cursor:
+            for doc in price_docs:
                 prices[doc['symbol']] = {
                     'current': doc['current_price'],
                     'change': doc['change'],
@@ -414,31 +749,348 @@ class MongoDBManager:
             
             return prices
         except Exception as e:
-            print(f"Error getting multiple price cache: {e}")
+            logger.error("Error getting multiple price cache: %s", e)
             return {}
 
-    def clear_old_price_cache(self, hours=24):
-        """Clear old price cache entries (older than specified hours)"""
+    # Price history methods
+    def record_price_ticks(self, prices, at=None):
+        """
+        Append one tick per symbol and fold it into the 1m/5m/1h/1d bars
+        
+        Args:
+            prices: Dictionary mapping symbols to their current price
+            at: Tick time (naive UTC), now by default
+        """
         try:
+            if not prices:
+                return
+            at = at or datetime.utcnow()
+            prices = {symbol.upper(): float(price) for symbol, price in prices.items()}
+            
             if self.client is None:
-                # Use fallback storage - nothing to clear
+                # Use fallback storage
+                self._fallback_price_history.record(prices, at)
                 return
             
-            # Use MongoDB price cache collection
-            price_collection = self.db.price_cache
+            if self.price_ticks_enabled:
+                self.db.price_ticks.insert_many(
+                    [{'ts': at, 'symbol': symbol, 'price': price} for symbol, price in prices.items()],
+                    ordered=False
+                )
+            
+            # Merge the tick into each open bar on the server, so bars stay right when
+            # another instance takes over as leader in the middle of one
+            operations = []
+            for resolution in RESOLUTIONS:
+                start = bucket_start(at, resolution)
+                bar_fields = {'updated_at': at}
+                if BAR_RETENTION[resolution] is not None:
+                    bar_fields['expires_at'] = start + BAR_RETENTION[resolution]
+                for symbol, price in prices.items():
+                    operations.append(UpdateOne(
+                        {'symbol': symbol, 'resolution': resolution, 'start': start},
+                        [{'$set': {
+                            'open': {'$ifNull': ['$open', price]},
+                            'high': {'$max': ['$high', price]},
+                            'low': {'$min': ['$low', price]},
+                            'close': price,
+                            'ticks': {'$add': [{'$ifNull': ['$ticks', 0]}, 1]},
+                            **bar_fields
+                        }}],
+                        upsert=True
+                    ))
+            self.db.price_bars.bulk_write(operations, ordered=False)
+            logger.debug("Recorded %d price ticks into %d bars", len(prices), len(operations))
+        except Exception as e:
+            logger.error("Error recording price ticks: %s", e)
+
+    def get_price_bars(self, symbol, resolution, start, end, limit=MAX_BARS_PER_QUERY):
+        """
+        OHLC bars of one symbol starting in [start, end), oldest first
+        
+        Raises:
+            ValueError: Unknown resolution
+        """
+        validate_resolution(resolution)
+        symbol = symbol.upper()
+        try:
+            if self.client is None:
+                # Use fallback storage
+                return self._fallback_price_history.bars(symbol, resolution, start, end, limit)
+            
+            # Newest first so a range longer than limit keeps its most recent bars
+            docs = list(self.db.price_bars.find(
+                {'symbol': symbol, 'resolution': resolution, 'start': {'$gte': start, '$lt': end}},
+                {'_id': 0, 'start': 1, 'open': 1, 'high': 1, 'low': 1, 'close': 1, 'ticks': 1}
+            ).sort('start', -1).limit(limit))
+            return [
+                bar_dict(doc['start'], doc['open'], doc['high'], doc['low'], doc['close'], doc['ticks'])
+                for doc in reversed(docs)
+            ]
+        except Exception as e:
+            logger.error("Error getting price bars for %s: %s", symbol, e)
+            return []
+
+    # Symbol exchange methods
+    def get_symbol_exchanges(self):
+        """Get the persisted symbol -> exchange map, seeded from the price cache"""
+        try:
+            if self.client is None:
+                # Use fallback storage
+                if not hasattr(self, '_fallback_symbol_exchanges'):
+                    self._fallback_symbol_exchanges = {}
+                return dict(self._fallback_symbol_exchanges)
+            
+            exchanges = {}
+            # Price cache documents written with an exchange
+            for doc in self.db.price_cache.find({'exchange': {'$exists': True}}, {'symbol': 1, 'exchange': 1}):
+                exchanges[doc['symbol']] = doc['exchange']
+            
+            # Explicitly resolved symbols take precedence
+            for doc in self.db.symbol_exchanges.find({}, {'symbol': 1, 'exchange': 1}):
+                exchanges[doc['symbol']] = doc['exchange']
+            
+            return exchanges
+        except Exception as e:
+            logger.error("Error getting symbol exchanges: %s", e)
+            return {}
+
+    def save_symbol_exchanges(self, exchanges):
+        """Upsert symbol -> exchange pairs"""
+        try:
+            if self.client is None:
+                # Use fallback storage
+                if not hasattr(self, '_fallback_symbol_exchanges'):
+                    self._fallback_symbol_exchanges = {}
+                self._fallback_symbol_exchanges.update({s.upper(): e for s, e in exchanges.items()})
+                return
+            
+            if not exchanges:
+                return
+            
+            now = datetime.utcnow()
+            self.db.symbol_exchanges.bulk_write([
+                UpdateOne(
+                    {'symbol': symbol.upper()},
+                    {'$set': {'symbol': symbol.upper(), 'exchange': exchange, 'updated_at': now}},
+                    upsert=True
+                )
+                for symbol, exchange in exchanges.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error("Error saving symbol exchanges: %s", e)
+
+    def delete_symbol_exchanges(self, symbols):
+        """Forget the exchange of the given symbols"""
+        try:
+            symbols = [s.upper() for s in symbols]
+            if self.client is None:
+                # Use fallback storage
+                if not hasattr(self, '_fallback_symbol_exchanges'):
+                    self._fallback_symbol_exchanges = {}
+                for symbol in symbols:
+                    self._fallback_symbol_exchanges.pop(symbol, None)
+                return
+            
+            self.db.symbol_exchanges.delete_many({'symbol': {'$in': symbols}})
+            self.db.price_cache.update_many({'symbol': {'$in': symbols}}, {'$unset': {'exchange': ''}})
+        except Exception as e:
+            logger.error("Error deleting symbol exchanges: %s", e)
+
+    # Watch registry methods
+    def _track_watch_refs(self, kind, doc_id, symbols):
+        """Point a saved document's watch references at symbols, passing its ID through"""
+        if doc_id:
+            try:
+                self.watch_registry.set_refs(watch_key(kind, doc_id), symbols)
+            except Exception as e:
+                print(f"Error updating watch registry: {e}")
+        return doc_id
+
+    def _untrack_watch_refs(self, kind, doc_id, deleted):
+        """Drop a deleted document's watch references, passing the delete result through"""
+        if deleted:
+            try:
+                self.watch_registry.remove_refs(watch_key(kind, doc_id))
+            except Exception as e:
+                print(f"Error updating watch registry: {e}")
+        return deleted
+
+    def get_watch_refs(self):
+        """Get the persisted watch references, key -> symbols"""
+        try:
+            if self.client is None:
+                # Use fallback storage
+                if not hasattr(self, '_fallback_watch_refs'):
+                    self._fallback_watch_refs = {}
+                return dict(self._fallback_watch_refs)
+            
+            # Expired references may outlive their expires_at until the TTL monitor runs
+            unexpired = {'$or': [{'expires_at': {'$exists': False}}, {'expires_at': {'$gt': datetime.utcnow()}}]}
+            return {doc['_id']: doc['symbols'] for doc in self.db.watch_refs.find(unexpired, {'symbols': 1})}
+        except Exception as e:
+            print(f"Error getting watch refs: {e}")
+            return {}
+
+    def save_watch_refs(self, refs, ttl=None):
+        """Upsert key -> symbols watch references, expiring ttl seconds from now if given"""
+        try:
+            if self.client is None:
+                # Use fallback storage
+                if not hasattr(self, '_fallback_watch_refs'):
+                    self._fallback_watch_refs = {}
+                self._fallback_watch_refs.update({key: list(symbols) for key, symbols in refs.items()})
+                return
+            
+            if not refs:
+                return
+            
+            fields = {} if ttl is None else {'expires_at': datetime.utcnow() + timedelta(seconds=ttl)}
+            self.db.watch_refs.bulk_write([
+                UpdateOne({'_id': key}, {'$set': {'symbols': list(symbols), **fields}}, upsert=True)
+                for key, symbols in refs.items()
+            ], ordered=False)
+            self._bump_watch_refs_version()
+        except Exception as e:
+            print(f"Error saving watch refs: {e}")
+
+    def delete_watch_ref(self, key):
+        """Delete the watch references of one key"""
+        try:
+            if self.client is None:
+                # Use fallback storage
+                if hasattr(self, '_fallback_watch_refs'):
+                    self._fallback_watch_refs.pop(key, None)
+                return
             
-            # Calculate cutoff time
-            from datetime import timedelta
-            cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+            self.db.watch_refs.delete_one({'_id': key})
+            self._bump_watch_refs_version()
+        except Exception as e:
+            print(f"Error deleting watch ref: {e}")
+
+    def _bump_watch_refs_version(self):
+        self.db.counters.update_one({'_id': 'watch_refs'}, {'$inc': {'version': 1}}, upsert=True)
+
+    def get_watch_refs_version(self):
+        """Counter bumped on every watch reference change, None when not shared between processes"""
+        try:
+            if self.client is None:
+                return None
             
-            # Delete old entries
-            result = price_collection.delete_many({
-                'last_update': {'$lt': cutoff_time}
-            })
+            doc = self.db.counters.find_one({'_id': 'watch_refs'})
+            return doc['version'] if doc else 0
+        except Exception as e:
+            print(f"Error getting watch refs version: {e}")
+            return None
+
+    def scan_watch_refs(self):
+        """Rebuild watch references from trades, watchlist items and screeners"""
+        refs = {}
+        try:
+            if self.client is None:
+                trades = getattr(self, '_fallback_trades', [])
+                items = getattr(self, '_fallback_watchlist', [])
+                screeners = getattr(self, '_fallback_storage', [])
+            else:
+                trades = self.db.trades.find({'symbol': {'$exists': True}}, {'symbol': 1})
+                items = self.db.watchlist.find({'symbol': {'$exists': True}}, {'symbol': 1})
+                screeners = self.db.screeners.find({'params.symbols': {'$exists': True}}, {'params.symbols': 1})
             
-            print(f"✅ Cleared {result.deleted_count} old price cache entries")
+            for kind, docs in (('trade', trades), ('watchlist', items)):
+                for doc in docs:
+                    if doc.get('symbol'):
+                        refs[watch_key(kind, doc['_id'])] = [doc['symbol'].upper()]
+            for doc in screeners:
+                symbols = screener_symbols(doc.get('params'))
+                if symbols:
+                    refs[watch_key('screener', doc['_id'])] = symbols
+        except Exception as e:
+            print(f"Error scanning watch refs: {e}")
+        return refs
+
+    # Query result methods, for CSV downloads served by any process
+    def save_query_result(self, result_id, filename, csv_chunks):
+        """
+        Keep a query result's CSV for RESULT_STORE_TTL seconds
+        
+        Args:
+            result_id: Handle the client downloads the result with
+            filename: Download file name
+            csv_chunks: List of CSV text chunks, the first one with the header
+        """
+        result_doc = {
+            '_id': result_id,
+            'filename': filename,
+            'csv_chunks': csv_chunks,
+            'expires_at': datetime.utcnow() + timedelta(seconds=RESULT_STORE_TTL)
+        }
+        if self.client is not None:
+            try:
+                self.db.query_results.insert_one(result_doc)
+                return
+            except Exception as e:
+                logger.error("Error saving query result %s, keeping it in this process: %s", result_id, e)
+        self._fallback_query_results.set(result_id, result_doc)
+
+    def get_query_result(self, result_id):
+        """Get a stored query result, None if it is unknown or expired"""
+        result_doc = self._fallback_query_results.get(result_id)
+        if result_doc is not None or self.client is None:
+            return result_doc
+        try:
+            # The TTL monitor only runs once a minute, so expiry is checked here as well
+            return self.db.query_results.find_one({'_id': result_id, 'expires_at': {'$gt': datetime.utcnow()}})
         except Exception as e:
-            print(f"Error clearing old price cache: {e}")
+            logger.error("Error getting query result %s: %s", result_id, e)
+            return None
+
+    # Lease methods, for leader election between processes
+    def acquire_lease(self, name, owner, ttl_seconds):
+        """
+        Take a named lease if it is free or expired, or renew it if owner already holds it
+        
+        Expiry is computed with the database clock ($$NOW), so instances with skewed
+        clocks still agree on who holds the lease.
+        
+        Returns:
+            The lease document if owner holds the lease, else None
+        """
+        if self.client is None:
+            return None
+        try:
+            return self.db.leases.find_one_and_update(
+                {'_id': name, '$or': [{'owner': owner}, {'$expr': {'$lt': ['$expires_at', '$$NOW']}}]},
+                [{'$set': {
+                    'acquired_at': {'$cond': [{'$eq': ['$owner', owner]}, '$acquired_at', '$$NOW']},
+                    'owner': owner,
+                    'renewed_at': '$$NOW',
+                    'expires_at': {'$add': ['$$NOW', int(ttl_seconds * 1000)]}
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Held by another owner and not expired
+            return None
+
+    def release_lease(self, name, owner):
+        """Give up a lease held by owner"""
+        if self.client is None:
+            return
+        try:
+            self.db.leases.delete_one({'_id': name, 'owner': owner})
+        except Exception as e:
+            print(f"Error releasing lease {name}: {e}")
+
+    def get_lease(self, name):
+        """Get a lease document, None if nobody ever took it"""
+        if self.client is None:
+            return None
+        try:
+            return self.db.leases.find_one({'_id': name})
+        except Exception as e:
+            print(f"Error getting lease {name}: {e}")
+            return None
 
     # Trades collection methods
     def save_trade(self, user_id, trade_data):
@@ -457,7 +1109,7 @@ class MongoDBManager:
                     'created_at': datetime.utcnow()
                 }
                 self._fallback_trades.append(trade_doc)
-                return str(self._fallback_counter)
+                return self._track_watch_refs('trade', str(self._fallback_counter), [trade_data.get('symbol')])
             
             # Use MongoDB trades collection
             trades_collection = self.db.trades
@@ -470,14 +1122,14 @@ class MongoDBManager:
             }
             
             result = trades_collection.insert_one(trade_doc)
-            return str(result.inserted_id)
+            return self._track_watch_refs('trade', str(result.inserted_id), [trade_data.get('symbol')])
             
         except Exception as e:
             print(f"Error saving trade: {e}")
             return None
 
-    def get_user_trades(self, user_id):
-        """Get all trades for a user"""
+    def get_user_trades(self, user_id, fields=None):
+        """Get all trades for a user, optionally only some fields (see pagination.TRADE_FIELDS)"""
         try:
             if self.client is None:
                 # Use fallback storage
@@ -487,7 +1139,7 @@ class MongoDBManager:
                 user_trades = []
                 for trade in self._fallback_trades:
                     if trade.get('user_id') == user_id:
-                        trade_copy = trade.copy()
+                        trade_copy = select_fields(trade, fields).copy()
                         trade_copy['_id'] = str(trade_copy['_id'])
                         trade_copy['created_at'] = trade_copy['created_at'].isoformat()
                         user_trades.append(trade_copy)
@@ -497,7 +1149,7 @@ class MongoDBManager:
             # Use MongoDB trades collection
             trades_collection = self.db.trades
             
-            trades = list(trades_collection.find({'user_id': user_id}).sort('created_at', -1))
+            trades = list(trades_collection.find({'user_id': user_id}, projection(fields)).sort('created_at', -1))
             
             # Convert ObjectId to string and dates to ISO format
             for trade in trades:
@@ -510,6 +1162,23 @@ class MongoDBManager:
             print(f"Error getting user trades: {e}")
             return []
 
+    def get_user_trades_page(self, user_id, cursor=None, limit=PAGE_SIZE_DEFAULT, fields=None):
+        """
+        One page of a user's trades, newest first
+
+        Returns:
+            (trades, next_cursor), next_cursor None on the last page
+
+        Raises:
+            ValueError: For a malformed cursor
+        """
+        if cursor:
+            decode_cursor(cursor)
+        if self.client is None:
+            trades = [trade for trade in getattr(self, '_fallback_trades', []) if trade.get('user_id') == user_id]
+            return self._fallback_page(trades, cursor, limit, fields)
+        return self._find_page(self.db.trades, {'user_id': user_id}, cursor, limit, fields)
+
     def delete_trade(self, user_id, trade_id):
         """Delete a trade for a user"""
         try:
@@ -521,7 +1190,7 @@ class MongoDBManager:
                 for i, trade in enumerate(self._fallback_trades):
                     if trade.get('_id') == trade_id and trade.get('user_id') == user_id:
                         del self._fallback_trades[i]
-                        return True
+                        return self._untrack_watch_refs('trade', trade_id, True)
                 return False
             
             # Use MongoDB trades collection
@@ -532,7 +1201,7 @@ class MongoDBManager:
                     '_id': ObjectId(trade_id),
                     'user_id': user_id
                 })
-                return result.deleted_count > 0
+                return self._untrack_watch_refs('trade', trade_id, result.deleted_count > 0)
             except:
                 return False
             
@@ -552,6 +1221,8 @@ class MongoDBManager:
                     if trade.get('_id') == trade_id and trade.get('user_id') == user_id:
                         trade.update(trade_data)
                         trade['updated_at'] = datetime.utcnow()
+                        if 'symbol' in trade_data:
+                            self._track_watch_refs('trade', trade_id, [trade_data['symbol']])
                         return True
                 return False
             
@@ -567,6 +1238,8 @@ class MongoDBManager:
                     },
                     {'$set': trade_data}
                 )
+                if result.modified_count > 0 and 'symbol' in trade_data:
+                    self._track_watch_refs('trade', trade_id, [trade_data['symbol']])
                 return result.modified_count > 0
             except:
                 return False
@@ -592,7 +1265,7 @@ class MongoDBManager:
                     'created_at': datetime.utcnow()
                 }
                 self._fallback_watchlist.append(item_doc)
-                return str(self._fallback_counter)
+                return self._track_watch_refs('watchlist', str(self._fallback_counter), [item_data.get('symbol')])
             
             # Use MongoDB watchlist collection
             watchlist_collection = self.db.watchlist
@@ -605,7 +1278,7 @@ class MongoDBManager:
             }
             
             result = watchlist_collection.insert_one(item_doc)
-            return str(result.inserted_id)
+            return self._track_watch_refs('watchlist', str(result.inserted_id), [item_data.get('symbol')])
             
         except Exception as e:
             print(f"Error saving watchlist item: {e}")
@@ -645,6 +1318,23 @@ class MongoDBManager:
             print(f"Error getting user watchlist: {e}")
             return []
 
+    def get_user_watchlist_page(self, user_id, cursor=None, limit=PAGE_SIZE_DEFAULT, fields=None):
+        """
+        One page of a user's watchlist, newest first
+
+        Returns:
+            (items, next_cursor), next_cursor None on the last page
+
+        Raises:
+            ValueError: For a malformed cursor
+        """
+        if cursor:
+            decode_cursor(cursor)
+        if self.client is None:
+            items = [item for item in getattr(self, '_fallback_watchlist', []) if item.get('user_id') == user_id]
+            return self._fallback_page(items, cursor, limit, fields)
+        return self._find_page(self.db.watchlist, {'user_id': user_id}, cursor, limit, fields)
+
     def delete_watchlist_item(self, user_id, item_id):
         """Delete a watchlist item for a user"""
         try:
@@ -656,7 +1346,7 @@ class MongoDBManager:
                 for i, item in enumerate(self._fallback_watchlist):
                     if item.get('_id') == item_id and item.get('user_id') == user_id:
                         del self._fallback_watchlist[i]
-                        return True
+                        return self._untrack_watch_refs('watchlist', item_id, True)
                 return False
             
             # Use MongoDB watchlist collection
@@ -667,7 +1357,7 @@ class MongoDBManager:
                     '_id': ObjectId(item_id),
                     'user_id': user_id
                 })
-                return result.deleted_count > 0
+                return self._untrack_watch_refs('watchlist', item_id, result.deleted_count > 0)
             except:
                 return False
             
@@ -687,6 +1377,8 @@ class MongoDBManager:
                     if item.get('_id') == item_id and item.get('user_id') == user_id:
                         item.update(item_data)
                         item['updated_at'] = datetime.utcnow()
+                        if 'symbol' in item_data:
+                            self._track_watch_refs('watchlist', item_id, [item_data['symbol']])
                         return True
                 return False
             
@@ -702,6 +1394,8 @@ class MongoDBManager:
                     },
                     {'$set': item_data}
                 )
+                if result.modified_count > 0 and 'symbol' in item_data:
+                    self._track_watch_refs('watchlist', item_id, [item_data['symbol']])
                 return result.modified_count > 0
             except:
                 return False
@@ -710,5 +1404,12 @@ class MongoDBManager:
             print(f"Error updating watchlist item: {e}")
             return False
 
+# Time every storage call, whichever backend serves it
+instrument_methods(
+    MongoDBManager,
+    metrics_registry.histogram('storage_call_seconds', 'MongoDBManager method latency', ['method']),
+    metrics_registry.counter('storage_call_errors', 'MongoDBManager methods that raised', ['method'])
+)
+
 # Global MongoDB manager instance
 mongodb_manager = MongoDBManager() 
\ No newline at end of file
@@ -0,0 +1,133 @@
+import base64
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Page sizes of the listing endpoints
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', '100'))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '1000'))
+
+# Listings are newest first, ties broken by _id so every document has one position
+PAGE_SORT = [('created_at', -1), ('_id', -1)]
+
+# Fields clients can select per listing; _id and created_at are always returned
+TRADE_FIELDS = ('symbol', 'type', 'price', 'quantity', 'date', 'notes', 'screenerId', 'timestamp', 'updated_at')
+WATCHLIST_FIELDS = ('symbol', 'category', 'notes', 'target_price', 'stop_loss', 'timestamp', 'updated_at')
+SCREENER_FIELDS = ('name', 'owner', 'tags', 'params', 'user_id', 'is_public', 'updated_at')
+ALWAYS_RETURNED = ('_id', 'created_at')
+
+
+def parse_limit(value, default: int = PAGE_SIZE_DEFAULT) -> int:
+    """Page size from a query parameter, capped at PAGE_SIZE_MAX"""
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return min(limit, PAGE_SIZE_MAX)
+
+
+def parse_fields(value, allowed: Iterable[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Fields from a comma-separated query parameter, None for all fields
+
+    Raises:
+        ValueError: For a field the listing doesn't have
+    """
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed and field not in ALWAYS_RETURNED]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}, expected some of {list(allowed)}")
+    return fields
+
+
+def projection(fields: Optional[Tuple[str, ...]]) -> Optional[Dict]:
+    """MongoDB projection for the selected fields, always keeping the cursor fields"""
+    if fields is None:
+        return None
+    return {field: 1 for field in (*ALWAYS_RETURNED, *fields)}
+
+
+def encode_cursor(doc: Dict) -> str:
+    """Opaque cursor pointing just past a document"""
+    created_at = doc['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, str(doc['_id'])], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """(created_at, _id) of a cursor from encode_cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, doc_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(created_at: datetime, doc_id) -> Dict:
+    """MongoDB filter for documents after (created_at, _id) in PAGE_SORT order"""
+    return {
+        '$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': doc_id}}
+        ]
+    }
+
+
+def _created_at(doc) -> datetime:
+    created_at = doc['created_at']
+    return datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at
+
+
+def _id_order(doc) -> Tuple[int, str]:
+    # Fallback IDs are counters ('9' < '10'); ObjectId strings all have the same length
+    doc_id = str(doc['_id'])
+    return len(doc_id), doc_id
+
+
+def _page_order(doc):
+    return _created_at(doc), _id_order(doc)
+
+
+def page_in_memory(docs: Iterable[Dict], cursor: Optional[str], limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of in-memory documents in PAGE_SORT order, for fallback storage
+
+    Returns:
+        (documents, next_cursor), next_cursor None on the last page
+    """
+    # Oldest first by created_at alone, several times cheaper than sorting on (created_at, _id);
+    # fallback lists are kept in insertion order, which sorts in linear time
+    ordered = sorted(docs, key=_created_at)
+    end = len(ordered)
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        lo = bisect_left(ordered, created_at, key=_created_at)
+        hi = bisect_right(ordered, created_at, lo=lo, key=_created_at)
+        after = (len(doc_id), doc_id)
+        ordered[lo:hi] = sorted(ordered[lo:hi], key=_id_order)
+        end = lo + sum(1 for doc in ordered[lo:hi] if _id_order(doc) < after)
+    start = max(0, end - limit)
+    if start == end:
+        return [], None
+
+    # Documents created in the same instant are ordered by _id, enough to fix on this page
+    lo = bisect_left(ordered, _created_at(ordered[start]), key=_created_at)
+    ordered[lo:end] = sorted(ordered[lo:end], key=_page_order)
+    page = ordered[start:end][::-1]
+    next_cursor = encode_cursor(page[-1]) if start > 0 else None
+    return page, next_cursor
+
+
+def select_fields(doc: Dict, fields: Optional[Tuple[str, ...]]) -> Dict:
+    """Apply a field selection to an in-memory document"""
+    if fields is None:
+        return doc
+    return {field: doc[field] for field in (*ALWAYS_RETURNED, *fields) if field in doc}
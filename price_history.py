@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from market_hours import MARKET_TZ
+
+# Bar resolutions kept for every symbol, in seconds
+RESOLUTIONS = {
+    '1m': 60,
+    '5m': 300,
+    '1h': 3600,
+    '1d': 86400,
+}
+
+# How long MongoDB keeps each resolution, None to keep it forever
+BAR_RETENTION = {
+    '1m': timedelta(days=int(os.getenv('PRICE_HISTORY_1M_DAYS', '7'))),
+    '5m': timedelta(days=int(os.getenv('PRICE_HISTORY_5M_DAYS', '60'))),
+    '1h': timedelta(days=int(os.getenv('PRICE_HISTORY_1H_DAYS', '730'))),
+    '1d': None,
+}
+PRICE_TICK_RETENTION_SECONDS = int(os.getenv('PRICE_TICK_RETENTION_DAYS', '7')) * 86400
+
+# In-memory ring buffer sizes per symbol, for fallback storage
+PRICE_HISTORY_MEMORY_TICKS = int(os.getenv('PRICE_HISTORY_MEMORY_TICKS', '1000'))
+PRICE_HISTORY_MEMORY_BARS = int(os.getenv('PRICE_HISTORY_MEMORY_BARS', '1440'))
+
+# Range queries return at most this many bars, the most recent ones when there are more
+MAX_BARS_PER_QUERY = int(os.getenv('PRICE_HISTORY_MAX_BARS', '5000'))
+DEFAULT_BARS_PER_QUERY = 390  # one regular session of 1m bars
+
+
+def validate_resolution(resolution: str) -> int:
+    """Seconds per bar, raising ValueError for an unknown resolution"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}', expected one of {list(RESOLUTIONS)}")
+    return RESOLUTIONS[resolution]
+
+
+def bucket_start(at: datetime, resolution: str) -> datetime:
+    """
+    Start of the bar containing a UTC timestamp, as naive UTC like the rest of storage
+
+    Intraday bars are aligned to the epoch; daily bars start at midnight New York time so
+    one bar covers a whole trading day including pre- and post-market.
+    """
+    seconds = validate_resolution(resolution)
+    if resolution == '1d':
+        local = at.replace(tzinfo=timezone.utc).astimezone(MARKET_TZ)
+        midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight.astimezone(timezone.utc).replace(tzinfo=None)
+    epoch = int(at.replace(tzinfo=timezone.utc).timestamp())
+    return datetime.utcfromtimestamp(epoch - epoch % seconds)
+
+
+def default_range(resolution: str, start: datetime = None, end: datetime = None):
+    """Fill in a missing end (now) and start (DEFAULT_BARS_PER_QUERY bars before end)"""
+    seconds = validate_resolution(resolution)
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(seconds=seconds * DEFAULT_BARS_PER_QUERY)
+    return start, end
+
+
+def bar_dict(start, open_, high, low, close, ticks) -> Dict:
+    return {'start': start, 'open': open_, 'high': high, 'low': low, 'close': close, 'ticks': ticks}
+
+
+class PriceHistoryBuffer:
+    """
+    In-memory price history: a ring buffer of raw ticks and one of bars per resolution.
+
+    Each tick updates the open bar of every resolution in place (OHLC plus tick count), so
+    rollups never rescan ticks. Used when MongoDB is not available; it keeps only the most
+    recent PRICE_HISTORY_MEMORY_TICKS ticks and PRICE_HISTORY_MEMORY_BARS bars per symbol.
+    """
+
+    def __init__(self, max_ticks: int = PRICE_HISTORY_MEMORY_TICKS, max_bars: int = PRICE_HISTORY_MEMORY_BARS):
+        self.max_ticks = max_ticks
+        self.max_bars = max_bars
+        self._ticks: Dict[str, deque] = {}  # symbol -> (timestamp, price)
+        self._bars: Dict[tuple, deque] = {}  # (symbol, resolution) -> [start, open, high, low, close, ticks]
+        self._lock = threading.Lock()
+
+    def record(self, prices: Dict[str, float], at: datetime):
+        """Append one tick per symbol and fold it into the open bars"""
+        starts = {resolution: bucket_start(at, resolution) for resolution in RESOLUTIONS}
+        with self._lock:
+            for symbol, price in prices.items():
+                ticks = self._ticks.get(symbol)
+                if ticks is None:
+                    ticks = self._ticks[symbol] = deque(maxlen=self.max_ticks)
+                ticks.append((at, price))
+
+                for resolution, start in starts.items():
+                    bars = self._bars.get((symbol, resolution))
+                    if bars is None:
+                        bars = self._bars[(symbol, resolution)] = deque(maxlen=self.max_bars)
+                    bar = bars[-1] if bars else None
+                    if bar is not None and bar[0] == start:
+                        if price > bar[2]:
+                            bar[2] = price
+                        if price < bar[3]:
+                            bar[3] = price
+                        bar[4] = price
+                        bar[5] += 1
+                    else:
+                        bars.append([start, price, price, price, price, 1])
+
+    def bars(self, symbol: str, resolution: str, start: datetime, end: datetime,
+             limit: int = MAX_BARS_PER_QUERY) -> List[Dict]:
+        """Bars starting in [start, end), oldest first"""
+        validate_resolution(resolution)
+        with self._lock:
+            found = [list(bar) for bar in self._bars.get((symbol, resolution), ()) if start <= bar[0] < end]
+        return [bar_dict(*bar) for bar in found[-limit:]]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'symbols': len(self._ticks),
+                'ticks': sum(len(ticks) for ticks in self._ticks.values()),
+                'bars': sum(len(bars) for bars in self._bars.values())
+            }
+
+
+# Measure the cost of recording an update cycle
+if __name__ == "__main__":
+    buffer = PriceHistoryBuffer()
+    symbols = [f"SYM{i}" for i in range(1000)]
+    at = datetime(2026, 10, 16, 13, 30)
+    cycles = 200
+    start = time.perf_counter()
+    for cycle in range(cycles):
+        buffer.record({symbol: 100.0 + (cycle * 7 + i) % 13 for i, symbol in enumerate(symbols)}, at)
+        at += timedelta(seconds=30)
+    elapsed = (time.perf_counter() - start) / cycles
+    bars = buffer.bars('SYM0', '5m', datetime(2026, 10, 16), datetime(2026, 10, 17))
+    print(f"{len(symbols)} symbols: {elapsed * 1000:.1f} ms per cycle, {buffer.get_stats()}")
+    print(f"SYM0 5m bars: {len(bars)}, first {bars[0]}")
@@ -0,0 +1,204 @@
+import json
+import os
+import secrets
+import threading
+from typing import Dict, Iterable, Optional
+
+# Seconds between keep-alive comments on an idle stream
+PRICE_STREAM_HEARTBEAT = float(os.getenv('PRICE_STREAM_HEARTBEAT', '15'))
+# Milliseconds browsers wait before reconnecting a dropped stream
+PRICE_STREAM_RETRY_MS = int(os.getenv('PRICE_STREAM_RETRY_MS', '3000'))
+PRICE_STREAM_MAX_SYMBOLS = int(os.getenv('PRICE_STREAM_MAX_SYMBOLS', '200'))
+
+# Fields compared to decide whether a symbol's price changed
+PRICE_FIELDS = ('current', 'change', 'changePercent')
+
+
+def format_event(data: Dict, event_id: str = None, event: str = 'prices') -> str:
+    """One Server-Sent Events message"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One connected client: its symbols and the prices changed since it was last woken"""
+
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols = frozenset(symbols)
+        self.pending: Dict[str, Dict] = {}
+        self.pending_seq = 0
+        self.wakeup = threading.Event()
+
+
+class PriceStreamHub:
+    """
+    Fans price updates out to streaming clients.
+
+    PriceUpdater publishes every cycle's prices; only symbols whose price changed are
+    queued, and only for the clients subscribed to them. Slow clients get the queued
+    changes merged into one message. Event IDs are `<epoch>-<seq>`: a client reconnecting
+    with a Last-Event-ID from this process is sent what changed since, anything else
+    gets a full snapshot of its symbols.
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self._seq = 0
+        self._latest: Dict[str, Dict] = {}  # symbol -> last published price
+        self._changed_at: Dict[str, int] = {}  # symbol -> seq of its last change
+        self._subscribers: Dict[str, set] = {}  # symbol -> subscriptions
+        self._lock = threading.Lock()
+        self.stats = {
+            'published_cycles': 0,
+            'changed_prices': 0,
+            'messages_queued': 0,
+            'connections': 0
+        }
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def _parse_event_id(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Sequence number of an event ID issued by this process, else None"""
+        if not last_event_id:
+            return None
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        return int(seq)
+
+    def publish(self, prices: Dict[str, Dict]) -> int:
+        """
+        Queue changed prices for subscribed clients
+
+        Args:
+            prices: symbol -> {'current', 'change', 'changePercent', ...}
+
+        Returns:
+            Number of symbols whose price changed
+        """
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            changed = 0
+            woken = set()
+            for symbol, price in prices.items():
+                if not price:
+                    continue
+                symbol = symbol.upper()
+                previous = self._latest.get(symbol)
+                if previous is not None and all(previous.get(f) == price.get(f) for f in PRICE_FIELDS):
+                    continue
+                self._latest[symbol] = price
+                self._changed_at[symbol] = seq
+                changed += 1
+                for subscription in self._subscribers.get(symbol, ()):
+                    subscription.pending[symbol] = price
+                    subscription.pending_seq = seq
+                    woken.add(subscription)
+            self.stats['published_cycles'] += 1
+            self.stats['changed_prices'] += changed
+            self.stats['messages_queued'] += len(woken)
+        for subscription in woken:
+            subscription.wakeup.set()
+        return changed
+
+    def subscribe(self, symbols: Iterable[str], last_event_id: str = None, snapshot_loader=None):
+        """
+        Register a client
+
+        Args:
+            symbols: Symbols the client wants
+            last_event_id: Last-Event-ID sent by a reconnecting client
+            snapshot_loader: Called with symbols the hub has no price for yet, returns
+                symbol -> price, used for the initial snapshot
+
+        Returns:
+            (Subscription, initial prices to send, event ID for them)
+        """
+        subscription = Subscription(s.upper() for s in symbols)
+        with self._lock:
+            since = self._parse_event_id(last_event_id)
+            if since is None:
+                initial = {s: self._latest[s] for s in subscription.symbols if s in self._latest}
+            else:
+                initial = {
+                    s: self._latest[s] for s in subscription.symbols
+                    if self._changed_at.get(s, 0) > since
+                }
+            for symbol in subscription.symbols:
+                self._subscribers.setdefault(symbol, set()).add(subscription)
+            seq = self._seq
+            self.stats['connections'] += 1
+
+        if since is None and snapshot_loader is not None:
+            missing = [s for s in subscription.symbols if s not in initial]
+            if missing:
+                initial.update(snapshot_loader(missing))
+        return subscription, initial, self.event_id(seq)
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for symbol in subscription.symbols:
+                subscribers = self._subscribers.get(symbol)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[symbol]
+
+    def subscribed_symbols(self):
+        """Symbols at least one connected client wants"""
+        with self._lock:
+            return list(self._subscribers)
+
+    def take(self, subscription: Subscription, timeout: float):
+        """
+        Wait for changes queued for a client
+
+        Returns:
+            (prices, event ID), or (None, None) if nothing changed within timeout
+        """
+        if not subscription.wakeup.wait(timeout):
+            return None, None
+        with self._lock:
+            subscription.wakeup.clear()
+            prices, subscription.pending = subscription.pending, {}
+            seq = subscription.pending_seq
+        if not prices:
+            return None, None
+        return prices, self.event_id(seq)
+
+    def stream(self, subscription: Subscription, initial: Dict, initial_event_id: str,
+               heartbeat: float = PRICE_STREAM_HEARTBEAT):
+        """Yield a client's Server-Sent Events until it disconnects"""
+        try:
+            yield f"retry: {PRICE_STREAM_RETRY_MS}\n\n"
+            yield format_event(initial, initial_event_id)
+            while True:
+                prices, event_id = self.take(subscription, heartbeat)
+                if prices is None:
+                    yield ': heartbeat\n\n'
+                else:
+                    yield format_event(prices, event_id)
+        finally:
+            self.unsubscribe(subscription)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            clients = {id(sub) for subs in self._subscribers.values() for sub in subs}
+            return {
+                **self.stats,
+                'epoch': self.epoch,
+                'last_event_id': self.event_id(self._seq),
+                'clients': len(clients),
+                'subscribed_symbols': len(self._subscribers),
+                'known_prices': len(self._latest)
+            }
+
+
+# Global price stream hub instance
+price_stream_hub = PriceStreamHub()
@@ -2,16 +2,27 @@ import threading
 import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Set
-import requests
-import json
+from http_transport import http_transport
 from mongodb_config import mongodb_manager
-from tradingview_api import fetch_stock_prices
+from price_stream import price_stream_hub
+from tradingview_api import fetch_stock_prices_batched
+from leader_election import LeaderElector, default_lease
+from logging_config import get_logger
+from market_hours import REGULAR
+from update_scheduler import UpdateSchedule
+
+logger = get_logger(__name__)
 
 class PriceUpdater:
     def __init__(self):
         self.running = False
         self.thread = None
-        self.update_interval = 30  # seconds
+        # Set to cut the wait between cycles short: on stop, and when this process becomes leader
+        self._wakeup = threading.Event()
+        self.schedule = UpdateSchedule()
+        # Only the leader among processes/instances fetches from TradingView
+        self.elector = LeaderElector(default_lease(mongodb_manager, 'price_updater'), on_elected=self._wakeup.set)
+        self.update_interval = self.schedule.interval()  # seconds, for the current market phase
         self.last_update = None
         self.stats = {
             'total_updates': 0,
@@ -19,138 +30,148 @@ class PriceUpdater:
             'symbols_updated': 0,
             'errors': 0
         }
+        self._sync_interval()
     
     def start(self):
         """Start the background price updater thread"""
         if self.running:
-            print("Price updater is already running")
+            logger.info("Price updater is already running")
             return
         
         self.running = True
+        self._wakeup.clear()
+        self.elector.start()
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
-        print("✅ Background price updater started")
+        logger.info("✅ Background price updater started")
     
     def stop(self):
         """Stop the background price updater thread"""
         self.running = False
+        self._wakeup.set()
         if self.thread:
             self.thread.join(timeout=5)
-        print("✅ Background price updater stopped")
+        self.elector.stop()
+        logger.info("✅ Background price updater stopped")
     
     def _run(self):
         """Main loop for the background price updater"""
-        print("🔄 Price updater thread started")
+        logger.info("🔄 Price updater thread started")
         
         while self.running:
+            cycle_start = time.monotonic()
             try:
-                self._update_all_prices()
-                time.sleep(self.update_interval)
+                if self.elector.is_leader:
+                    success = self._update_all_prices()
+                else:
+                    success = self._relay_shared_prices()
             except Exception as e:
-                print(f"❌ Error in price updater thread: {e}")
+                logger.exception("❌ Error in price updater thread: %s", e)
                 self.stats['errors'] += 1
-                time.sleep(60)  # Wait longer on error
+                success = False
+            
+            delay = self.schedule.next_delay(time.monotonic() - cycle_start, success)
+            self._sync_interval()
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+    
+    def _sync_interval(self):
+        """Follow the current market phase's cadence; in-process price entries stay valid for one cycle"""
+        self.update_interval = self.schedule.interval()
+        mongodb_manager.price_memory_cache.ttl = self.update_interval
     
     def _get_all_watched_symbols(self) -> Set[str]:
-        """Get all unique symbols from all MongoDB tables"""
-        symbols = set()
-        
+        """Symbols referenced by trades, watchlist items, screeners and the default list"""
         try:
-            # Get symbols from screeners
-            screeners = mongodb_manager.get_all_screeners()
-            for screener in screeners:
-                if 'params' in screener and 'symbols' in screener['params']:
-                    screener_symbols = screener['params']['symbols']
-                    if isinstance(screener_symbols, str):
-                        # Parse comma-separated symbols
-                        symbols.update([s.strip().upper() for s in screener_symbols.split(',') if s.strip()])
-                    elif isinstance(screener_symbols, list):
-                        symbols.update([s.upper() for s in screener_symbols if s])
-            
-            # Get symbols from price cache (already watched)
-            if mongodb_manager.client:
-                price_collection = mongodb_manager.db.price_cache
-                cached_symbols = price_collection.distinct('symbol')
-                symbols.update(cached_symbols)
-            
-            # Get symbols from user trades (if we had user trades in MongoDB)
-            # For now, we'll add some common symbols that users typically trade
-            common_symbols = [
-                'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'NFLX',
-                'AMD', 'INTC', 'CRM', 'ADBE', 'PYPL', 'NKE', 'DIS', 'JPM',
-                'V', 'WMT', 'PG', 'JNJ', 'UNH', 'HD', 'MA', 'BAC', 'PFE',
-                'ABT', 'KO', 'PEP', 'TMO', 'ABBV', 'MRK', 'AVGO', 'COST',
-                'ACN', 'DHR', 'NEE', 'LLY', 'TXN', 'UNP', 'RTX', 'HON',
-                'QCOM', 'LOW', 'UPS', 'IBM', 'CAT', 'SPGI', 'GS', 'MS',
-                'AMGN', 'ISRG', 'GILD', 'T', 'DE', 'PLD', 'ADI', 'CME'
-            ]
-            symbols.update(common_symbols)
-            
-            print(f"📊 Found {len(symbols)} unique symbols to watch")
+            # Pick up trades, watchlist items and screeners saved through other processes
+            mongodb_manager.watch_registry.refresh()
+            symbols = mongodb_manager.watch_registry.symbols()
+            logger.debug("📊 Found %d unique symbols to watch", len(symbols))
             return symbols
             
         except Exception as e:
-            print(f"❌ Error getting watched symbols: {e}")
+            logger.error("❌ Error getting watched symbols: %s", e)
             return set()
     
-    def _update_all_prices(self):
-        """Update prices for all watched symbols"""
+    def _relay_shared_prices(self) -> bool:
+        """Follower cycle: push prices the leader wrote to the shared cache to this process's streams"""
+        symbols = price_stream_hub.subscribed_symbols()
+        if symbols:
+            price_stream_hub.publish(mongodb_manager.get_multiple_price_cache(symbols))
+        return True
+    
+    def _update_all_prices(self) -> bool:
+        """Update prices for all watched symbols, returning whether the cycle succeeded"""
         try:
             symbols = self._get_all_watched_symbols()
             if not symbols:
-                print("⚠️ No symbols to update")
-                return
+                logger.warning("⚠️ No symbols to update")
+                return True
             
-            print(f"🔄 Updating prices for {len(symbols)} symbols...")
+            logger.debug("🔄 Updating prices for %d symbols...", len(symbols))
             
             # Convert set to list for API call
             symbol_list = list(symbols)
             
-            # Fetch live prices from TradingView
-            live_prices = fetch_stock_prices(symbol_list)
+            # Fetch live prices from TradingView in concurrent chunks
+            live_prices = fetch_stock_prices_batched(symbol_list)
             
-            # Update MongoDB cache with live prices
-            updated_count = 0
-            for symbol, price_data in live_prices.items():
-                if price_data:
-                    try:
-                        mongodb_manager.update_price_cache(
-                            symbol=symbol,
-                            current_price=price_data['current'],
-                            change=price_data['change'],
-                            change_percent=price_data['changePercent']
-                        )
-                        updated_count += 1
-                    except Exception as e:
-                        print(f"❌ Error updating cache for {symbol}: {e}")
+            # Update MongoDB cache with live prices in one bulk write
+            cache_results = mongodb_manager.bulk_update_price_cache(
+                {symbol: price_data for symbol, price_data in live_prices.items() if price_data}
+            )
+            updated_count = sum(cache_results.values())
+            
+            # Keep every tick for intraday charts
+            mongodb_manager.record_price_ticks({
+                symbol: price_data['current'] for symbol, price_data in live_prices.items() if price_data
+            })
+            
+            # Push changed prices to connected browsers
+            update_time = datetime.utcnow().isoformat()
+            price_stream_hub.publish({
+                symbol: {
+                    'current': price_data['current'],
+                    'change': price_data['change'],
+                    'changePercent': price_data['changePercent'],
+                    'lastUpdate': update_time
+                }
+                for symbol, price_data in live_prices.items() if price_data
+            })
             
             # Update stats
             self.stats['total_updates'] += 1
             self.stats['last_update_time'] = datetime.utcnow()
             self.stats['symbols_updated'] = updated_count
             
-            print(f"✅ Updated {updated_count}/{len(symbols)} symbols")
-            
-            # Clean up old cache entries (older than 24 hours)
-            if self.stats['total_updates'] % 48 == 0:  # Every 24 minutes (48 * 30 seconds)
-                mongodb_manager.clear_old_price_cache(hours=24)
+            logger.info("✅ Updated %d/%d symbols", updated_count, len(symbols))
+            return True
                 
         except Exception as e:
-            print(f"❌ Error updating all prices: {e}")
+            logger.exception("❌ Error updating all prices: %s", e)
             self.stats['errors'] += 1
+            return False
     
     def get_stats(self) -> Dict:
         """Get current statistics"""
         return {
             **self.stats,
             'running': self.running,
-            'update_interval': self.update_interval
+            'role': 'leader' if self.elector.is_leader else 'follower',
+            'leader': self.elector.get_stats(),
+            'update_interval': self.update_interval,
+            'schedule': self.schedule.get_stats(),
+            'watch_registry': mongodb_manager.watch_registry.get_stats(),
+            'price_stream': price_stream_hub.get_stats(),
+            'http_transport': http_transport.get_stats(),
+            'price_memory_cache': mongodb_manager.price_memory_cache.get_stats()
         }
     
-    def set_update_interval(self, seconds: int):
-        """Set the update interval"""
-        self.update_interval = max(10, seconds)  # Minimum 10 seconds
-        print(f"⏱️ Price update interval set to {self.update_interval} seconds")
+    def set_update_interval(self, seconds: int, phase: str = REGULAR):
+        """Set the update interval for a market phase (regular session by default)"""
+        self.schedule.set_interval(phase, seconds)  # Minimum 10 seconds
+        self._sync_interval()
+        logger.info("⏱️ Price update interval for %s set to %d seconds", phase, self.schedule.intervals[phase])
 
 # Global price updater instance
 price_updater = PriceUpdater()
@@ -167,12 +188,54 @@ def get_price_updater_stats():
     """Get price updater statistics"""
     return price_updater.get_stats()
 
-def set_price_update_interval(seconds: int):
-    """Set the price update interval"""
-    price_updater.set_update_interval(seconds)
+def set_price_update_interval(seconds: int, phase: str = REGULAR):
+    """Set the price update interval for a market phase"""
+    price_updater.set_update_interval(seconds, phase)
 
 # Test function
 if __name__ == "__main__":
+    import sys
+    
+    if '--log-benchmark' in sys.argv:
+        # Update cycle time with every line written on the updater thread vs queued INFO logging
+        import tempfile
+        import tradingview_api
+        from logging_config import setup_logging
+        from stub_scanner import StubScannerServer
+        from symbol_resolver import symbol_resolver
+        
+        server = StubScannerServer()
+        tradingview_api.SCANNER_URL = server.start()
+        bench_symbols = [f"SYM{i}" for i in range(1000)]
+        symbol_resolver._loaded = True
+        symbol_resolver._exchanges.update({symbol: 'NASDAQ' for symbol in bench_symbols})
+        mongodb_manager.watch_registry.symbols = lambda: frozenset(bench_symbols)
+        mongodb_manager.watch_registry.refresh = lambda: None
+        
+        cycles = 20
+        with tempfile.TemporaryFile('w') as log_file:
+            for label, level, use_queue in (
+                ('full response + line per symbol, synchronous', 'DEBUG', False),
+                ('INFO, queued', 'INFO', True),
+            ):
+                setup_logging(level, stream=log_file, use_queue=use_queue)
+                price_updater._update_all_prices()  # warm up connections
+                log_file.flush()
+                logged_before = log_file.tell()
+                start, start_cpu = time.perf_counter(), time.process_time()
+                for _ in range(cycles):
+                    price_updater._update_all_prices()
+                elapsed = (time.perf_counter() - start) / cycles
+                elapsed_cpu = (time.process_time() - start_cpu) / cycles
+                setup_logging(level, stream=log_file, use_queue=False)  # drain the queue
+                log_file.flush()
+                logged = (log_file.tell() - logged_before) / cycles
+                print(f"{label:>46}: {elapsed * 1000:6.1f} ms per cycle, {elapsed_cpu * 1000:6.1f} ms CPU, "
+                      f"{logged / 1024:6.1f} KiB logged per cycle")
+        
+        server.stop()
+        sys.exit(0)
+    
     print("Testing price updater...")
     
     # Start the updater
@@ -0,0 +1,125 @@
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+
+from market_hours import is_regular_session
+from query_params import PARAMS
+from ttl_cache import TTLCache
+from universe_snapshot import USE_UNIVERSE_SNAPSHOT
+
+# Result cache configuration
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '64'))
+QUERY_CACHE_TTL_OPEN = float(os.getenv('QUERY_CACHE_TTL_OPEN', '60'))  # seconds, regular session
+QUERY_CACHE_TTL_CLOSED = float(os.getenv('QUERY_CACHE_TTL_CLOSED', '900'))  # seconds, market closed
+
+
+def _normalize_value(value):
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if value in ('', '-'):
+            return None
+        try:
+            value = float(value)
+        except ValueError:
+            return value.lower()
+    if isinstance(value, (int, float)):
+        return round(float(value), 6)
+    return value
+
+
+def normalize_query_params(params: Dict) -> Tuple:
+    """
+    Cache key: one (name, value) pair per PARAMS entry, defaults filled in, plus the
+    requested source so snapshot and scanner results are never served for each other
+    """
+    return tuple(
+        (param.name, _normalize_value(params.get(param.name, param.default)))
+        for param in PARAMS
+    ) + (('use_snapshot', bool(params.get('use_snapshot', USE_UNIVERSE_SNAPSHOT))),)
+
+
+class QueryResultCache:
+    """
+    LRU cache of query_by_params results keyed by normalized screener parameters.
+
+    Entries live for a short TTL during the regular session and longer while the market
+    is closed. Concurrent requests for the same key wait on a single computation.
+    """
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl_open=QUERY_CACHE_TTL_OPEN, ttl_closed=QUERY_CACHE_TTL_CLOSED):
+        self.ttl_open = ttl_open
+        self.ttl_closed = ttl_closed
+        self._results = TTLCache(maxsize, ttl_open)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'computations': 0,
+            'collapsed_requests': 0,
+            'errors': 0
+        }
+
+    def current_ttl(self) -> float:
+        return self.ttl_open if is_regular_session() else self.ttl_closed
+
+    def get_or_compute(self, params: Dict, compute: Callable):
+        """
+        Return the cached result for params, computing it at most once at a time
+
+        Args:
+            params: query_by_params keyword arguments
+            compute: Called with params on a cache miss
+
+        Returns:
+            A copy of the result DataFrame, safe for the caller to modify
+        """
+        key = normalize_query_params(params)
+        result = self._results.get(key)
+        if result is not None:
+            return result.copy()
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.stats['collapsed_requests'] += 1
+
+        if owner:
+            try:
+                result = compute(params)
+                self._results.set(key, result, ttl=self.current_ttl())
+                with self._lock:
+                    self.stats['computations'] += 1
+                future.set_result(result)
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        return future.result().copy()
+
+    def clear(self):
+        self._results.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._results.get_stats(),
+                **self.stats,
+                'in_flight': len(self._inflight),
+                'ttl': self.current_ttl(),
+                'ttl_open': self.ttl_open,
+                'ttl_closed': self.ttl_closed
+            }
+
+
+# Global query result cache instance
+query_result_cache = QueryResultCache()
@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from tradingview_screener import Column, Or
+
+from consts import Consts
+
+
+@dataclass
+class CompiledFilter:
+    """
+    A single screener predicate.
+
+    `server_expression` is sent to the TradingView screener when the API can express the
+    predicate. `local_mask` is the equivalent pandas predicate; it is applied to scanner
+    results only when there is no server expression, and always when evaluating against
+    a local universe snapshot.
+    """
+    name: str
+    local_mask: Callable
+    server_expression: Optional[dict] = None
+
+    @property
+    def is_server_side(self) -> bool:
+        return self.server_expression is not None
+
+
+def _min_ratio_filter(name: str, column: str, min_ratio: float) -> CompiledFilter:
+    """column / close >= min_ratio, pushed down as `column above% close` when the ratio is positive"""
+    local_mask = lambda df: df[column] / df['close'] >= min_ratio
+    if min_ratio > 0:
+        return CompiledFilter(name, local_mask, server_expression=Column(column).above_pct('close', min_ratio))
+    return CompiledFilter(name, local_mask)
+
+
+def compile_filters(params: Dict) -> List[CompiledFilter]:
+    """
+    Compile query_by_params parameters into screener predicates.
+
+    Args:
+        params: Dictionary keyed by the names in query_params.PARAMS
+
+    Returns:
+        List of CompiledFilter, server-side wherever the screener supports the predicate
+    """
+    filters = []
+
+    # Exchange restrictions collapse into a single isin / not_in
+    otc_exchanges = Consts.OTC_EXCHANGES if params.get('filter_out_otc') else []
+    if params.get('us_exchanges_only'):
+        exchanges = [e for e in Consts.US_EXCHANGES if e not in otc_exchanges]
+        filters.append(CompiledFilter(
+            'exchange',
+            lambda df: df['exchange'].isin(exchanges),
+            server_expression=Column('exchange').isin(exchanges)
+        ))
+    elif otc_exchanges:
+        filters.append(CompiledFilter(
+            'exchange',
+            lambda df: ~df['exchange'].isin(otc_exchanges),
+            server_expression=Column('exchange').not_in(otc_exchanges)
+        ))
+
+    min_price = params.get('min_price')
+    if min_price is not None:
+        filters.append(CompiledFilter(
+            'min_price',
+            lambda df: df['close'] >= min_price,
+            server_expression=Column('close') >= min_price
+        ))
+    min_relative_volume = params.get('min_relative_volume')
+    if min_relative_volume is not None:
+        filters.append(CompiledFilter(
+            'min_relative_volume',
+            lambda df: df['relative_volume'] > min_relative_volume,
+            server_expression=Column('relative_volume') > min_relative_volume
+        ))
+    min_change = params.get('min_change')
+    if min_change is not None:
+        filters.append(CompiledFilter(
+            'min_change',
+            lambda df: df['change'] > min_change,
+            server_expression=Column('change') > min_change
+        ))
+
+    if params.get('min_sma20_above_pct') is not None:
+        filters.append(_min_ratio_filter('min_sma20_above_pct', 'SMA20', params['min_sma20_above_pct']))
+    # ATR% / ADR% are percentages of the close, the screener compares against a multiplier
+    if params.get('min_atr_pct') is not None:
+        filters.append(_min_ratio_filter('min_atr_pct', 'ATR', params['min_atr_pct'] / 100))
+    if params.get('min_adr_pct') is not None:
+        filters.append(_min_ratio_filter('min_adr_pct', 'ADR', params['min_adr_pct'] / 100))
+
+    if params.get('bullish_candlestick_patterns_only'):
+        filters.append(CompiledFilter(
+            'bullish_candlestick_patterns_only',
+            lambda df: (df[Consts.BULLISH_CANDLE_COLUMNS] >= 1).any(axis=1),
+            server_expression=Or(*[Column(col) >= 1 for col in Consts.BULLISH_CANDLE_COLUMNS])
+        ))
+
+    return filters
+
+
+def apply_local_filters(df, filters: List[CompiledFilter], include_server_side: bool = False):
+    """
+    Apply predicates locally, combined into a single boolean mask
+
+    Args:
+        df: DataFrame to filter
+        filters: Compiled filters
+        include_server_side: Also apply predicates the screener already evaluated,
+            used when filtering a local universe snapshot
+
+    Returns:
+        The filtered DataFrame (df itself when nothing had to be applied)
+    """
+    mask = None
+    for f in filters:
+        if include_server_side or not f.is_server_side:
+            f_mask = f.local_mask(df)
+            mask = f_mask if mask is None else mask & f_mask
+    return df if mask is None else df[mask]
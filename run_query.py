@@ -2,14 +2,21 @@ from telegram import Update
 from telegram.ext import (
     ContextTypes, MessageHandler, filters, ConversationHandler, ApplicationBuilder, CommandHandler
 )
-from tradingview_screener import Query, Column
+from tradingview_screener import Query, And
 
 from commands import Command
 from consts import Consts
 from default_params import Defaults
+from metrics import metrics_registry
+from query_filters import compile_filters, apply_local_filters
+from query_cache import query_result_cache
 from query_params import APPLY_DEFAULTS, PARAMS
+from screener_runner import screener_runner
+from symbol_resolver import symbol_resolver
 from telegram_bot import create_csv_from_pd, BOT_TOKEN, add_help_command
-from utils import clean_candle_columns
+from tradingview_api import fetch_scanner_data
+from universe_snapshot import universe_snapshotter, USE_UNIVERSE_SNAPSHOT
+from utils import add_derived_columns, clean_candle_columns
 
 
 # Search All Fields AT || https://shner-elmo.github.io/TradingView-Screener/fields/stocks.html
@@ -72,7 +79,10 @@ async def param_handler(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> int:
     return PARAMS[idx].var
 
 
-async def get_result(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> int:
+async def get_result(update: Update, ctx: ContextTypes.DEFAULT_TYPE, query=None, runner=None) -> int:
+    # query and runner default to cached_query_by_params and the shared screener_runner
+    query = query or cached_query_by_params
+    runner = runner or screener_runner
     params = {p.name: ctx.user_data.get(p.name, p.default) for p in PARAMS}
     # Map to query_by_params signature
     query_params = {
@@ -86,22 +96,39 @@ async def get_result(update: Update, ctx: ContextTypes.DEFAULT_TYPE) -> int:
         'filter_out_otc': params['filter_out_otc'],
         'bullish_candlestick_patterns_only': params['bullish_candlestick_patterns_only'],
     }
-    df = query_by_params(**query_params)
+    ctx.user_data.clear()
+
+    # Run the scan on the worker pool so other chats keep being served meanwhile
+    chat_id = update.effective_chat.id
+    queued = runner.pending(chat_id)
+    status_msg = await update.message.reply_text(
+        f"⏳ Queued behind {queued} earlier run(s)..." if queued else "⏳ Running screener..."
+    )
+    try:
+        df = await runner.run(chat_id, query, **query_params)
+    except Exception as e:
+        print(f"❌ Error running screener for chat {chat_id}: {e}")
+        await status_msg.edit_text(f"❌ Screener failed: {e}")
+        return ConversationHandler.END
+
     if df.empty:
-        await update.message.reply_text("No symbols found.")
+        await status_msg.edit_text("No symbols found.")
     else:
-        await update.message.reply_text(f"Found {len(df)} symbols! Full results are available in CSV.")
+        await status_msg.edit_text(f"Found {len(df)} symbols! Full results are available in CSV.")
         buf = create_csv_from_pd(df)
         if buf:
             await ctx.bot.send_document(
-                chat_id=update.effective_chat.id,
+                chat_id=chat_id,
                 document=buf,
                 caption=f"Found {len(df)} symbols"
             )
-    ctx.user_data.clear()
     return ConversationHandler.END
 
 
+QUERY_STAGE_SECONDS = metrics_registry.histogram(
+    'query_stage_seconds', 'query_by_params latency per stage', ['stage', 'source'])
+
+
 def query_by_params(
         us_exchanges_only=Defaults.US_EXCHANGES_ONLY,
         min_price=Defaults.MIN_PRICE,
@@ -112,6 +139,7 @@ def query_by_params(
         min_adr_pct=Defaults.MIN_ADR_PCT,
         filter_out_otc=Defaults.FILTER_OUT_OTC,
         bullish_candlestick_patterns_only=Defaults.BULLISH_CANDLESTICK_PATTERNS_ONLY,
+        use_snapshot=USE_UNIVERSE_SNAPSHOT,
         **kwargs
 ):
     # Use kwargs for flexibility, but explicit defaults for all main params
@@ -132,57 +160,66 @@ def query_by_params(
     {params}
     """)
 
-    trv_query = Query().select(*Consts.COLUMNS_TO_RETRIEVE)
-    query_filters = []
-    if params['us_exchanges_only']:
-        query_filters.append(Column('exchange').isin(Consts.US_EXCHANGES))
-    if params['min_price'] is not None:
-        query_filters.append(Column('close') >= params['min_price'])
-    if params['min_relative_volume'] is not None:
-        query_filters.append(Column('relative_volume') > params['min_relative_volume'])
-    if params['min_change'] is not None:
-        query_filters.append(Column('change') > params['min_change'])
-    if params['min_sma20_above_pct'] is not None:
-        query_filters.append(Column('SMA20').above_pct('close', params['min_sma20_above_pct']))
-    _, query_results_pd = trv_query.where(*query_filters).order_by(
-        'market_cap_basic',
-        ascending=False
-    ).limit(int(1e6)).get_scanner_data()
-    
-    # Add SMA20/Close ratio column
-    query_results_pd['SMA20/Close'] = query_results_pd['SMA20'] / query_results_pd['close']
-    
-    # Filter by SMA20/Close ratio if specified (only minimum)
-    if params['min_sma20_above_pct'] is not None:
-        query_results_pd = query_results_pd[query_results_pd['SMA20/Close'] >= params['min_sma20_above_pct']]
-    
-    query_results_pd['ATR%'] = query_results_pd['ATR'] / query_results_pd['close'] * 100
-    if params['min_atr_pct'] is not None:
-        query_results_pd = query_results_pd[query_results_pd['ATR%'] >= params['min_atr_pct']]
-
-    query_results_pd['ADR%'] = query_results_pd['ADR'] / query_results_pd['close'] * 100
-    if params['min_adr_pct'] is not None:
-        query_results_pd = query_results_pd[query_results_pd['ADR%'] >= params['min_adr_pct']]
-
-    # Filter out OTC exchanges if specified
-    if params['filter_out_otc']:
-        otc_exchanges = ['OTC', 'OTC MARKETS']
-        query_results_pd = query_results_pd[~query_results_pd['exchange'].isin(otc_exchanges)]
-
-    if params['bullish_candlestick_patterns_only']:
-        query_results_pd = query_results_pd[
-            (
-                    query_results_pd['Candle.Hammer'] +
-                    query_results_pd['Candle.Engulfing.Bullish'] +
-                    query_results_pd['Candle.Marubozu.White']
-            ) >= 1
-            ]
-    clean_candles_df = clean_candle_columns(query_results_pd)
+    query_filters = compile_filters(params)
+    snapshot = None
+    if use_snapshot:
+        with QUERY_STAGE_SECONDS.time('fetch', 'snapshot'):
+            snapshot = universe_snapshotter.get_fresh()
+
+    if snapshot is not None:
+        # Evaluate every predicate locally against the shared universe snapshot
+        query_report = {
+            'source': 'snapshot',
+            'snapshot_age': round(snapshot.age, 1),
+            'snapshot_taken_at': snapshot.taken_at_utc.isoformat(),
+            'rows_matched': len(snapshot.df),
+            'rows_fetched': 0,
+        }
+        with QUERY_STAGE_SECONDS.time('filters', 'snapshot'):
+            clean_candles_df = apply_local_filters(snapshot.df, query_filters, include_server_side=True).copy()
+            clean_candles_df['exchange'] = clean_candles_df['exchange'].astype(str)
+    else:
+        server_expressions = [f.server_expression for f in query_filters if f.is_server_side]
+
+        trv_query = Query().select(*Consts.COLUMNS_TO_RETRIEVE)
+        if server_expressions:
+            trv_query = trv_query.where2(And(*server_expressions))
+        trv_query = trv_query.order_by(
+            'market_cap_basic',
+            ascending=False
+        ).limit(int(1e6))
+        with QUERY_STAGE_SECONDS.time('fetch', 'scanner'):
+            rows_matched, query_results_pd = fetch_scanner_data(trv_query)
+        query_report = {
+            'source': 'scanner',
+            'snapshot_age': None,
+            'snapshot_taken_at': None,
+            'rows_matched': rows_matched,
+            'rows_fetched': len(query_results_pd),
+        }
+        # Screener tickers carry the exchange, which lets price fetches skip exchange probes
+        symbol_resolver.record_tickers(query_results_pd['ticker'])
+
+        # Only predicates the screener can't express are evaluated locally
+        with QUERY_STAGE_SECONDS.time('filters', 'scanner'):
+            query_results_pd = apply_local_filters(query_results_pd, query_filters).copy()
+        with QUERY_STAGE_SECONDS.time('derived_columns', 'scanner'):
+            add_derived_columns(query_results_pd)
+        with QUERY_STAGE_SECONDS.time('candles', 'scanner'):
+            clean_candles_df = clean_candle_columns(query_results_pd)
     
     # Order final results by SMA20/Close ratio in descending order
-    clean_candles_df = clean_candles_df.sort_values('SMA20/Close', ascending=False)
+    with QUERY_STAGE_SECONDS.time('sort', query_report['source']):
+        clean_candles_df = clean_candles_df.sort_values('SMA20/Close', ascending=False)
     
-    return clean_candles_df[
+    query_report.update({
+        'rows_kept': len(clean_candles_df),
+        'server_filters': [] if snapshot else [f.name for f in query_filters if f.is_server_side],
+        'local_filters': [f.name for f in query_filters if snapshot or not f.is_server_side],
+    })
+    print(f"📊 Query report: {query_report}")
+
+    results_df = clean_candles_df[
         [
             'name',
             'exchange',
@@ -197,11 +234,19 @@ def query_by_params(
             'candlestick_pattern',
         ]
     ]
+    results_df.attrs['query_report'] = query_report
+    return results_df
+
+
+def cached_query_by_params(**params):
+    """query_by_params through the shared result cache, identical concurrent calls run once"""
+    return query_result_cache.get_or_compute(params, lambda p: query_by_params(**p))
 
 
 def main_telegram():
     print("BUILDING TELEGRAM BOT...")
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # Updates are handled concurrently, screener runs themselves are bounded by screener_runner
+    app = ApplicationBuilder().token(BOT_TOKEN).concurrent_updates(True).build()
     states = {p.var: [MessageHandler(filters.TEXT & ~filters.COMMAND, param_handler)] for p in PARAMS}
     states[APPLY_DEFAULTS] = [MessageHandler(filters.TEXT & ~filters.COMMAND, get_apply_defaults)]
     conv = ConversationHandler(
@@ -212,6 +257,8 @@ def main_telegram():
 
     add_help_command(app)
     app.add_handler(conv)
+    if USE_UNIVERSE_SNAPSHOT:
+        universe_snapshotter.start()
     app.run_polling()
 
 
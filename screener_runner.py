@@ -0,0 +1,49 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+# Maximum number of screener runs executing at once
+SCREENER_WORKERS = int(os.getenv('SCREENER_WORKERS', '4'))
+
+
+class ScreenerRunner:
+    """
+    Runs blocking screener queries off the asyncio event loop.
+
+    Work goes to a bounded thread pool, so one chat's full-universe scan doesn't
+    freeze the bot for everyone else. Runs from the same chat are queued and
+    executed one after another.
+    """
+
+    def __init__(self, max_workers=SCREENER_WORKERS):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='screener')
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._pending: Dict[int, int] = {}
+
+    def pending(self, chat_id) -> int:
+        """Number of runs queued or running for a chat"""
+        return self._pending.get(chat_id, 0)
+
+    async def run(self, chat_id, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the worker pool, after any earlier runs from the same chat"""
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        self._pending[chat_id] = self._pending.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._pending[chat_id] -= 1
+            if not self._pending[chat_id]:
+                del self._pending[chat_id]
+                del self._chat_locks[chat_id]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+# Global screener runner instance
+screener_runner = ScreenerRunner()
@@ -0,0 +1,258 @@
+import heapq
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Results returned by a search, best first
+SEARCH_LIMIT_DEFAULT = int(os.getenv('SCREENER_SEARCH_LIMIT', '50'))
+
+# How much a query word matching each field adds to a screener's score; matching a whole
+# word counts double, matching the start of a word ("mom" in "momentum") counts once
+SEARCH_FIELD_WEIGHTS = {'name': 3, 'tags': 2, 'owner': 1}
+EXACT_MATCH_FACTOR = 2
+
+# Fields stored on screener documents for search, never returned to clients
+SEARCH_DOC_FIELDS = ('search_words', 'search')
+HIDDEN_SEARCH_PROJECTION = {field: 0 for field in SEARCH_DOC_FIELDS}
+
+MAX_QUERY_WORDS = 8
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text) -> List[str]:
+    """Lowercase words of a name, owner, tag list or query; punctuation separates words"""
+    return _WORD.findall(str(text or '').lower())
+
+
+def query_words(query: str) -> List[str]:
+    """Distinct words of a search query, at most MAX_QUERY_WORDS"""
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_WORDS]
+
+
+def search_fields(screener: Dict) -> Dict:
+    """
+    Search fields for a screener document: the words of each searchable field, and all of
+    them together for the index
+
+    Returns:
+        {'search_words': [...], 'search': {'name': [...], 'tags': [...], 'owner': [...]}}
+    """
+    words = {field: list(dict.fromkeys(tokenize(screener.get(field)))) for field in SEARCH_FIELD_WEIGHTS}
+    all_words = sorted({word for field_words in words.values() for word in field_words})
+    return {'search_words': all_words, 'search': words}
+
+
+def mongo_score_expression(query: List[str]) -> Dict:
+    """A screener's score for the query words, as an aggregation expression over the 'search' field"""
+    terms = []
+    for term in query:
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            words = f'$search.{field}'
+            prefix_match = {'$anyElementTrue': [{'$map': {
+                'input': {'$ifNull': [words, []]},
+                'as': 'word',
+                'in': {'$eq': [{'$indexOfCP': ['$$word', term]}, 0]}
+            }}]}
+            terms.append({'$cond': [
+                {'$in': [term, {'$ifNull': [words, []]}]},
+                weight * EXACT_MATCH_FACTOR,
+                {'$cond': [prefix_match, weight, 0]}
+            ]})
+    return {'$add': terms}
+
+
+def mongo_match(query: List[str]) -> Dict:
+    """Filter for screeners with a word starting with every query word, served by the search_words index"""
+    # Anchored, case-sensitive prefixes of lowercase words become index range scans
+    return {'$and': [{'search_words': {'$regex': '^' + re.escape(term)}} for term in query]}
+
+
+def _sort_key(screener: Dict) -> Tuple:
+    # Newest first among equal scores, then by _id like the listings
+    created_at = screener.get('created_at')
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    doc_id = str(screener['_id'])
+    return created_at or datetime.min, len(doc_id), doc_id
+
+
+class ScreenerSearchIndex:
+    """
+    In-memory inverted index of screener words, for fallback storage.
+
+    Postings map each field's words to the IDs of screeners containing them; a sorted
+    vocabulary turns a query word into the range of words it is a prefix of. Matching,
+    visibility and scoring are set operations over postings, so only the final ranking
+    looks at individual screeners. Ranks like the MongoDB search.
+    """
+
+    def __init__(self):
+        self._docs: Dict[str, Tuple[Dict, Dict, Tuple]] = {}  # id -> (screener, words per field, sort key)
+        self._postings: Dict[str, Dict[str, set]] = {field: {} for field in SEARCH_FIELD_WEIGHTS}
+        self._all_postings: Dict[str, set] = {}  # word -> IDs, any field
+        self._public = set()
+        self._by_user: Dict[str, set] = {}
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._lock = threading.Lock()
+
+    def add(self, screener: Dict):
+        doc_id = str(screener['_id'])
+        words = search_fields(screener)['search']
+        with self._lock:
+            self._remove(doc_id)
+            self._docs[doc_id] = (screener, words, _sort_key(screener))
+            for field, field_words in words.items():
+                for word in field_words:
+                    self._postings[field].setdefault(word, set()).add(doc_id)
+                    postings = self._all_postings.get(word)
+                    if postings is None:
+                        postings = self._all_postings[word] = set()
+                        self._vocabulary_dirty = True
+                    postings.add(doc_id)
+            if screener.get('is_public', False):
+                self._public.add(doc_id)
+            if screener.get('user_id'):
+                self._by_user.setdefault(screener['user_id'], set()).add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(str(doc_id))
+
+    def _remove(self, doc_id: str):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        screener, words, _ = entry
+        for field, field_words in words.items():
+            for word in field_words:
+                self._discard(self._postings[field], word, doc_id)
+                if self._discard(self._all_postings, word, doc_id):
+                    self._vocabulary_dirty = True
+        self._public.discard(doc_id)
+        if screener.get('user_id'):
+            self._discard(self._by_user, screener['user_id'], doc_id)
+
+    @staticmethod
+    def _discard(postings: Dict[str, set], key: str, doc_id: str) -> bool:
+        """Remove an ID from a postings set, returning True if the set is gone"""
+        ids = postings.get(key)
+        if ids is None:
+            return False
+        ids.discard(doc_id)
+        if not ids:
+            del postings[key]
+            return True
+        return False
+
+    def _words_starting_with(self, term: str) -> List[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._all_postings)
+            self._vocabulary_dirty = False
+        start = bisect_left(self._vocabulary, term)
+        return self._vocabulary[start:bisect_left(self._vocabulary, term + '\uffff', start)]
+
+    @staticmethod
+    def _union(postings: Dict[str, set], words: List[str]) -> set:
+        return set().union(*(postings[word] for word in words if word in postings))
+
+    def search(self, query: str, user_id: Optional[str] = None, include_public: bool = True,
+               limit: int = SEARCH_LIMIT_DEFAULT) -> List[Tuple[Dict, int]]:
+        """
+        Screeners with a word starting with every query word, that the user can see, best first
+
+        Returns:
+            [(screener, score), ...]
+        """
+        terms = query_words(query)
+        if not terms:
+            return []
+        with self._lock:
+            prefixes = {term: self._words_starting_with(term) for term in terms}
+            candidates = None
+            for term in sorted(terms, key=lambda term: sum(len(self._all_postings[w]) for w in prefixes[term])):
+                matches = self._union(self._all_postings, prefixes[term])
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+            # Visibility follows the fallback listing in MongoDBManager.get_all_screeners
+            own = candidates & self._by_user.get(user_id, set()) if user_id else set()
+            candidates = own | (candidates & self._public) if include_public else own
+
+            scores = dict.fromkeys(candidates, 0)
+            for term in terms:
+                for field, weight in SEARCH_FIELD_WEIGHTS.items():
+                    postings = self._postings[field]
+                    # A word starting with the term adds the weight, the term itself adds it again
+                    for matches in (self._union(postings, prefixes[term]), postings.get(term, ())):
+                        for doc_id in candidates.intersection(matches):
+                            scores[doc_id] += weight
+
+            # Rank by score first; only the screeners in the top score levels are ordered by date
+            by_score: Dict[int, List[str]] = {}
+            for doc_id, doc_score in scores.items():
+                by_score.setdefault(doc_score, []).append(doc_id)
+            results = []
+            for doc_score in sorted(by_score, reverse=True):
+                entries = [self._docs[doc_id] for doc_id in by_score[doc_score]]
+                needed = limit - len(results)
+                for screener, _, _ in heapq.nlargest(needed, entries, key=lambda entry: entry[2]):
+                    results.append((screener, doc_score))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def __len__(self):
+        return len(self._docs)
+
+
+# Search latency at 100k screeners, against the substring scan it replaces
+if __name__ == "__main__":
+    import random
+
+    random.seed(0)
+    adjectives = ['momentum', 'breakout', 'gap', 'value', 'growth', 'swing', 'intraday', 'oversold',
+                  'small', 'large', 'tech', 'energy', 'biotech', 'dividend', 'volatile', 'steady']
+    nouns = ['scanner', 'setup', 'screen', 'plays', 'runners', 'movers', 'leaders', 'watch']
+    owners = [f"trader{i}" for i in range(2000)]
+    n = 100_000
+    screeners = [{
+        '_id': str(i),
+        'name': f"{random.choice(adjectives)} {random.choice(adjectives)} {random.choice(nouns)} {i % 997}",
+        'owner': random.choice(owners),
+        'tags': ', '.join(random.sample(adjectives, 2)),
+        'user_id': f"user{i % 5000}",
+        'is_public': i % 3 == 0,
+        'created_at': datetime(2026, 1, 1).isoformat()
+    } for i in range(n)]
+
+    index = ScreenerSearchIndex()
+    start = time.perf_counter()
+    for screener in screeners:
+        index.add(screener)
+    build = time.perf_counter() - start
+    print(f"{n} screeners indexed in {build:.2f} s")
+
+    def substring_scan(term):
+        term = term.lower()
+        return [s for s in screeners
+                if term in s['name'].lower() or term in s['owner'].lower() or term in s['tags'].lower()]
+
+    for query in ['momentum', 'mo', 'breakout scanner', 'trader1999', 'biotech 42', 'nothing']:
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            results = index.search(query, user_id='user7')
+        indexed = (time.perf_counter() - start) / runs
+        start = time.perf_counter()
+        for _ in range(3):
+            scanned = substring_scan(query)
+        scan = (time.perf_counter() - start) / 3
+        top = results[0][0]['name'] if results else '-'
+        print(f"{query!r:<20} indexed {indexed * 1000:7.2f} ms | substring scan {scan * 1000:7.1f} ms "
+              f"| {len(scanned)} substring hits, top: {top}")
@@ -0,0 +1,88 @@
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubScannerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self.server.count('requests')
+        tickers = payload.get('symbols', {}).get('tickers', [])
+        time.sleep(self.server.latency + self.server.per_ticker_latency * len(tickers))
+
+        if self.server.fail_every and self.server.stats['requests'] % self.server.fail_every == 0:
+            self._send(503, {'error': 'stub failure'})
+            return
+
+        data = [
+            {'s': ticker, 'd': [100.0 + i % 50, 1.0, 1.5, 1000 + i]}
+            for i, ticker in enumerate(tickers)
+            if self.server.known_tickers is None or ticker in self.server.known_tickers
+        ]
+        self._send(200, {'totalCount': len(data), 'data': data})
+
+    def _send(self, status, body):
+        body = json.dumps(body).encode()
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            encoding = 'gzip'
+        else:
+            encoding = None
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubScannerServer(ThreadingHTTPServer):
+    """
+    Local stand-in for scanner.tradingview.com used by the benchmarks.
+
+    Answers /america/scan with fake price rows for the requested tickers, after a
+    configurable per-request and per-ticker delay, and counts connections (handshakes)
+    and requests.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, per_ticker_latency=0.0, fail_every=0, known_tickers=None):
+        super().__init__(('127.0.0.1', 0), _StubScannerHandler)
+        self.latency = latency
+        self.per_ticker_latency = per_ticker_latency
+        self.fail_every = fail_every
+        self.known_tickers = known_tickers
+        self.stats = {'connections': 0, 'requests': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = {'connections': 0, 'requests': 0}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/america/scan"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,108 @@
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from logging_config import get_logger
+
+# Exchanges probed, in order of preference, for symbols we haven't resolved yet
+PROBE_EXCHANGES = ['NASDAQ', 'NYSE', 'AMEX']
+
+logger = get_logger(__name__)
+
+
+class SymbolResolver:
+    """
+    Persistent symbol -> exchange map.
+
+    Lets price fetches send one fully qualified ticker ("NASDAQ:AAPL") per symbol
+    instead of probing every exchange. Entries are learned from screener results and
+    from scanner responses, and persisted through MongoDBManager.
+    """
+
+    def __init__(self):
+        self._exchanges = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _storage(self):
+        # Imported lazily so modules that only fetch prices don't connect to MongoDB on import
+        from mongodb_config import mongodb_manager
+        return mongodb_manager
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                self._exchanges.update(self._storage().get_symbol_exchanges())
+                logger.info("📒 Loaded %d symbol exchanges", len(self._exchanges))
+            except Exception as e:
+                logger.error("❌ Error loading symbol exchanges: %s", e)
+            self._loaded = True
+
+    def get_exchange(self, symbol: str):
+        self._ensure_loaded()
+        return self._exchanges.get(symbol.upper())
+
+    def resolve(self, symbols: Iterable[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Split symbols into resolved tickers and unknown symbols
+
+        Args:
+            symbols: Plain symbols, e.g. ["AAPL", "XYZ"]
+
+        Returns:
+            Tuple of ({symbol: "EXCHANGE:SYMBOL"}, [symbols that need probing])
+        """
+        self._ensure_loaded()
+        resolved, unknown = {}, []
+        for symbol in symbols:
+            exchange = self._exchanges.get(symbol.upper())
+            if exchange:
+                resolved[symbol] = f"{exchange}:{symbol.upper()}"
+            else:
+                unknown.append(symbol)
+        return resolved, unknown
+
+    def record(self, exchanges: Dict[str, str]):
+        """Remember symbol -> exchange pairs, persisting only the ones that changed"""
+        self._ensure_loaded()
+        changed = {}
+        with self._lock:
+            for symbol, exchange in exchanges.items():
+                if not symbol or not exchange:
+                    continue
+                symbol = symbol.upper()
+                if self._exchanges.get(symbol) != exchange:
+                    self._exchanges[symbol] = exchange
+                    changed[symbol] = exchange
+        if changed:
+            try:
+                self._storage().save_symbol_exchanges(changed)
+            except Exception as e:
+                logger.error("❌ Error saving symbol exchanges: %s", e)
+
+    def record_tickers(self, tickers: Iterable[str]):
+        """Learn exchanges from fully qualified tickers such as "NYSE:KO" """
+        exchanges = {}
+        for ticker in tickers:
+            if isinstance(ticker, str) and ':' in ticker:
+                exchange, symbol = ticker.split(':', 1)
+                exchanges[symbol] = exchange
+        self.record(exchanges)
+
+    def forget(self, symbols: Iterable[str]):
+        """Drop symbols whose resolved ticker stopped returning data, so they get probed again"""
+        symbols = [s.upper() for s in symbols]
+        with self._lock:
+            removed = [s for s in symbols if self._exchanges.pop(s, None) is not None]
+        if removed:
+            try:
+                self._storage().delete_symbol_exchanges(removed)
+            except Exception as e:
+                logger.error("❌ Error deleting symbol exchanges: %s", e)
+
+
+# Global symbol resolver instance
+symbol_resolver = SymbolResolver()
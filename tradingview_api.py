@@ -1,25 +1,83 @@
+import os
 import requests
 import json
+import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Optional, List
 
-def fetch_stock_prices(symbols: List[str]) -> Dict[str, Optional[Dict]]:
+import pandas as pd
+
+from http_transport import http_transport
+from logging_config import RateLimitedLogger, get_logger, summarize
+from metrics import metrics_registry, timed
+from symbol_resolver import symbol_resolver, PROBE_EXCHANGES
+
+SCANNER_URL = 'https://scanner.tradingview.com/america/scan'
+
+logger = get_logger(__name__)
+# Per-symbol problems repeat every update cycle, report each symbol once per interval
+symbol_logger = RateLimitedLogger(logger)
+
+# Batch fetch configuration
+PRICE_FETCH_CHUNK_SIZE = int(os.getenv('PRICE_FETCH_CHUNK_SIZE', '100'))
+PRICE_FETCH_CONCURRENCY = int(os.getenv('PRICE_FETCH_CONCURRENCY', '4'))
+PRICE_FETCH_RETRIES = int(os.getenv('PRICE_FETCH_RETRIES', '2'))
+
+SCANNER_REQUEST_SECONDS = metrics_registry.histogram(
+    'scanner_request_seconds', 'TradingView scanner request latency, including parsing', ['kind'])
+SCANNER_REQUEST_ERRORS = metrics_registry.counter(
+    'scanner_request_errors', 'TradingView scanner requests that raised', ['kind'])
+PRICE_FETCH_SECONDS = metrics_registry.histogram(
+    'price_fetch_seconds', 'Latency of price fetches for a list of symbols', ['function'])
+PRICE_FETCH_SYMBOLS = metrics_registry.counter(
+    'price_fetch_symbols', 'Symbols requested from the scanner, by whether a price came back', ['result'])
+
+
+def fetch_scanner_data(query) -> tuple:
     """
-    Fetch live stock prices from TradingView Screener API
+    Run a tradingview_screener Query through the shared HTTP transport
+    
+    Args:
+        query: tradingview_screener Query object
+        
+    Returns:
+        Tuple of (total matching rows, DataFrame with a ticker column plus the selected columns)
+    """
+    with SCANNER_REQUEST_SECONDS.time('screen'):
+        try:
+            response = http_transport.post(query.url, json=query.query, timeout=20)
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            SCANNER_REQUEST_ERRORS.inc('screen')
+            raise
+    
+    columns = ['ticker', *query.query.get('columns', [])]
+    rows = [[item['s'], *item['d']] for item in data.get('data') or []]
+    return data.get('totalCount', len(rows)), pd.DataFrame(rows, columns=columns)
+
+@timed(SCANNER_REQUEST_SECONDS, 'prices')
+def _fetch_price_chunk(symbols: List[str]) -> Dict[str, Optional[Dict]]:
+    """
+    Fetch one scanner request worth of prices, raising on transport or HTTP errors
     
     Args:
         symbols: List of stock symbols to fetch prices for
         
     Returns:
-        Dictionary mapping symbols to price data or None if failed
+        Dictionary mapping symbols to price data or None if the scanner had no data for them
     """
-    if not symbols:
-        return {}
+    # One fully qualified ticker per known symbol, exchange probes only for unknown ones
+    resolved, unknown = symbol_resolver.resolve(symbols)
+    tickers = list(resolved.values())
+    for symbol in unknown:
+        tickers.extend(f"{exchange}:{symbol.upper()}" for exchange in PROBE_EXCHANGES)
     
     # Prepare the request payload
     payload = {
         "symbols": {
-            "tickers": []
+            "tickers": tickers
         },
         "columns": [
             "price",
@@ -27,91 +85,162 @@ def fetch_stock_prices(symbols: List[str]) -> Dict[str, Optional[Dict]]:
             "change_abs",
             "volume"
         ],
-        "range": [0, len(symbols)]
+        "range": [0, len(tickers)]
     }
     
-    # Add symbols for different exchanges
-    for symbol in symbols:
-        payload["symbols"]["tickers"].extend([
-            f"NASDAQ:{symbol}",
-            f"NYSE:{symbol}",
-            f"AMEX:{symbol}"
-        ])
-    
+    # Make the request to TradingView through the shared keep-alive session
     try:
-        # Make the request to TradingView
-        response = requests.post(
-            'https://scanner.tradingview.com/america/scan',
-            headers={
-                'Content-Type': 'application/json',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache'
-            },
-            json=payload,
-            timeout=10
-        )
-        
-        if not response.ok:
-            print(f"TradingView API error: HTTP {response.status} - {response.status_text}")
-            return {symbol: None for symbol in symbols}
-        
+        response = http_transport.post(SCANNER_URL, json=payload)
+        response.raise_for_status()
         data = response.json()
-        print(f"TradingView API response: {data}")
+    except Exception:
+        SCANNER_REQUEST_ERRORS.inc('prices')
+        raise
+    logger.debug("TradingView API response: %s", data)
+    
+    # Process the response
+    results = {}
+    if data.get('data'):
+        # Map tickers back to symbols: resolved symbols only accept their own ticker,
+        # probed symbols keep the first exchange in PROBE_EXCHANGES order
+        probe_rank = {exchange: rank for rank, exchange in enumerate(PROBE_EXCHANGES)}
+        expected_tickers = {ticker: symbol for symbol, ticker in resolved.items()}
+        unknown_by_upper = {symbol.upper(): symbol for symbol in unknown}
+        symbol_data = {}
+        for item in data['data']:
+            ticker = item.get('s', '')
+            if ticker in expected_tickers:
+                symbol_data[expected_tickers[ticker]] = (ticker, item)
+            elif ':' in ticker:
+                exchange, plain = ticker.split(':', 1)
+                symbol = unknown_by_upper.get(plain)
+                if symbol is None or exchange not in probe_rank:
+                    continue
+                current = symbol_data.get(symbol)
+                if current is None or probe_rank[exchange] < probe_rank[current[0].split(':', 1)[0]]:
+                    symbol_data[symbol] = (ticker, item)
         
-        # Process the response
-        results = {}
-        if data.get('data'):
-            # Create a mapping of symbols to their data
-            symbol_data = {}
-            for item in data['data']:
-                # Extract symbol from ticker (e.g., "NASDAQ:AAPL" -> "AAPL")
-                ticker = item.get('s', '')
-                if ':' in ticker:
-                    symbol = ticker.split(':')[1]
-                    symbol_data[symbol] = item
-            
-            # Map results back to original symbols
-            for symbol in symbols:
-                if symbol in symbol_data:
-                    item = symbol_data[symbol]
-                    try:
-                        current = float(item['d'][0])  # price
-                        change = float(item['d'][1])   # change
-                        change_percent = float(item['d'][2])  # change_abs
-                        
-                        results[symbol] = {
-                            'current': current,
-                            'change': change,
-                            'changePercent': change_percent
-                        }
-                        print(f"✅ Fetched price for {symbol}: ${current} ({change_percent}%)")
-                    except (IndexError, ValueError, KeyError) as e:
-                        print(f"❌ Error parsing data for {symbol}: {e}")
-                        results[symbol] = None
-                else:
-                    print(f"❌ No data found for {symbol}")
-                    results[symbol] = None
-        else:
-            print("❌ No data in TradingView response")
-            results = {symbol: None for symbol in symbols}
+        # Remember exchanges learned from probes, re-probe resolved tickers that went missing
+        symbol_resolver.record_tickers(symbol_data[s][0] for s in unknown if s in symbol_data)
+        symbol_resolver.forget(s for s in resolved if s not in symbol_data)
         
-        return results
+        # Map results back to original symbols
+        log_prices = logger.isEnabledFor(logging.DEBUG)
+        for symbol in symbols:
+            if symbol in symbol_data:
+                ticker, item = symbol_data[symbol]
+                try:
+                    current = float(item['d'][0])  # price
+                    change = float(item['d'][1])   # change
+                    change_percent = float(item['d'][2])  # change_abs
+                    
+                    results[symbol] = {
+                        'current': current,
+                        'change': change,
+                        'changePercent': change_percent,
+                        'exchange': ticker.split(':', 1)[0]
+                    }
+                    if log_prices:
+                        logger.debug("✅ Fetched price for %s: $%s (%s%%)", symbol, current, change_percent)
+                except (IndexError, ValueError, KeyError) as e:
+                    symbol_logger.warning(('parse', symbol), "❌ Error parsing data for %s: %s", symbol, e)
+                    results[symbol] = None
+            else:
+                results[symbol] = None
+    else:
+        logger.warning("❌ No data in TradingView response for %d symbols", len(symbols))
+        results = {symbol: None for symbol in symbols}
+    
+    missing = [symbol for symbol, price in results.items() if price is None]
+    logger.debug("Fetched %d/%d prices", len(results) - len(missing), len(results))
+    if missing and data.get('data'):
+        # Delisted or mistyped symbols stay missing cycle after cycle
+        symbol_logger.info(('missing', frozenset(missing)), "❌ No data found for %d symbols: %s",
+                           len(missing), summarize(missing))
+    PRICE_FETCH_SYMBOLS.inc('found', amount=len(results) - len(missing))
+    PRICE_FETCH_SYMBOLS.inc('missing', amount=len(missing))
+    return results
+
+@timed(PRICE_FETCH_SECONDS, 'fetch_stock_prices')
+def fetch_stock_prices(symbols: List[str]) -> Dict[str, Optional[Dict]]:
+    """
+    Fetch live stock prices from TradingView Screener API
+    
+    Args:
+        symbols: List of stock symbols to fetch prices for
         
+    Returns:
+        Dictionary mapping symbols to price data or None if failed
+    """
+    if not symbols:
+        return {}
+    
+    try:
+        return _fetch_price_chunk(symbols)
+    except requests.exceptions.HTTPError as e:
+        logger.error("TradingView API error: HTTP %s - %s", e.response.status_code, e.response.reason)
+        return {symbol: None for symbol in symbols}
     except requests.exceptions.RequestException as e:
-        print(f"❌ Request error: {e}")
+        logger.error("❌ Request error: %s", e)
         return {symbol: None for symbol in symbols}
     except json.JSONDecodeError as e:
-        print(f"❌ JSON decode error: {e}")
+        logger.error("❌ JSON decode error: %s", e)
         return {symbol: None for symbol in symbols}
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        logger.exception("❌ Unexpected error: %s", e)
         return {symbol: None for symbol in symbols}
 
+@timed(PRICE_FETCH_SECONDS, 'fetch_stock_prices_batched')
+def fetch_stock_prices_batched(symbols: List[str], chunk_size: int = PRICE_FETCH_CHUNK_SIZE,
+                               max_workers: int = PRICE_FETCH_CONCURRENCY,
+                               max_retries: int = PRICE_FETCH_RETRIES) -> Dict[str, Optional[Dict]]:
+    """
+    Fetch live stock prices in chunks with bounded concurrency
+    
+    Failed chunks are retried on their own, so one bad request doesn't lose the
+    prices of every other chunk.
+    
+    Args:
+        symbols: List of stock symbols to fetch prices for
+        chunk_size: Maximum number of symbols per scanner request
+        max_workers: Maximum number of requests in flight
+        max_retries: How many times a failed chunk is retried
+        
+    Returns:
+        Dictionary mapping symbols to price data or None if failed
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    
+    chunk_size = max(1, chunk_size)
+    pending = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    results = {}
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))  # Back off before retrying failed chunks
+            
+            futures = {executor.submit(_fetch_price_chunk, chunk): chunk for chunk in pending}
+            failed = []
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    logger.warning("❌ Price chunk of %d symbols failed (attempt %d): %s", len(chunk), attempt + 1, e)
+                    failed.append(chunk)
+            
+            pending = failed
+            if not pending:
+                break
+    
+    for chunk in pending:
+        results.update({symbol: None for symbol in chunk})
+    
+    return results
+
 def fetch_single_stock_price(symbol: str) -> Optional[Dict]:
     """
     Fetch price for a single stock symbol
@@ -127,6 +256,33 @@ def fetch_single_stock_price(symbol: str) -> Optional[Dict]:
 
 # Test function
 if __name__ == "__main__":
+    import sys
+    
+    if '--benchmark' in sys.argv:
+        # Wall-clock time vs chunk size and concurrency against a local mock scanner
+        import contextlib
+        import io
+        from stub_scanner import StubScannerServer
+        
+        server = StubScannerServer(latency=0.05, per_ticker_latency=0.0005)
+        SCANNER_URL = server.start()
+        bench_symbols = [f"SYM{i}" for i in range(1000)]
+        symbol_resolver._loaded = True
+        symbol_resolver._exchanges.update({symbol: 'NASDAQ' for symbol in bench_symbols})
+        
+        print(f"{len(bench_symbols)} symbols, mock latency 50ms + 0.5ms/ticker")
+        for chunk_size in (1000, 250, 100, 50):
+            for workers in (1, 2, 4, 8):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    prices = fetch_stock_prices_batched(bench_symbols, chunk_size=chunk_size, max_workers=workers)
+                elapsed = time.perf_counter() - start
+                fetched = sum(1 for p in prices.values() if p)
+                print(f"chunk={chunk_size:>4} workers={workers}: {elapsed * 1000:7.0f} ms ({fetched} prices)")
+        
+        server.stop()
+        sys.exit(0)
+    
     # Test with some popular stocks
     test_symbols = ["AAPL", "MSFT", "GOOGL", "TSLA"]
     print("Testing TradingView API...")
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded in-memory cache with per-entry expiry.
+
+    Entries are evicted least-recently-used first once `maxsize` is reached, and are
+    treated as missing once older than their TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    def _get_locked(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return value
+
+    def _set_locked(self, key, value, ttl, now):
+        self._entries[key] = (now + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get(self, key: Hashable):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            return self._get_locked(key, time.monotonic())
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict:
+        """Return {key: value} for the keys that are cached and fresh"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._get_locked(key, now)
+                if value is not None:
+                    found[key] = value
+        return found
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        """Cache a value, optionally with a shorter or longer TTL than the default"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._set_locked(key, value, ttl, time.monotonic())
+
+    def set_many(self, items: Dict, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for key, value in items.items():
+                self._set_locked(key, value, ttl, now)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hit_rate': self.stats['hits'] / lookups if lookups else 0.0
+            }
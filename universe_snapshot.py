@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+from tradingview_screener import Query
+
+from consts import Consts
+from symbol_resolver import symbol_resolver
+from tradingview_api import fetch_scanner_data
+from utils import add_derived_columns, clean_candle_columns
+
+# Snapshot configuration
+USE_UNIVERSE_SNAPSHOT = os.getenv('USE_UNIVERSE_SNAPSHOT', 'false').lower() == 'true'
+UNIVERSE_SNAPSHOT_INTERVAL = int(os.getenv('UNIVERSE_SNAPSHOT_INTERVAL', '60'))  # seconds
+UNIVERSE_SNAPSHOT_MAX_AGE = int(os.getenv('UNIVERSE_SNAPSHOT_MAX_AGE', str(2 * UNIVERSE_SNAPSHOT_INTERVAL)))
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """An immutable columnar copy of the whole screener universe"""
+    df: pd.DataFrame
+    taken_at: float  # time.monotonic()
+    taken_at_utc: datetime
+    rows_matched: int
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.taken_at
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Shrink the universe table: categorical exchange, int8 candle flags, precomputed derived columns"""
+    df['exchange'] = df['exchange'].astype('category')
+    candle_columns = [col for col in df.columns if col.startswith('Candle.')]
+    df[candle_columns] = df[candle_columns].fillna(0).astype('int8')
+    add_derived_columns(df)
+    clean_candle_columns(df)
+    return df
+
+
+class UniverseSnapshotter:
+    """
+    Periodically pulls the full US screener universe with every retrieved column.
+
+    query_by_params can then evaluate any parameter set locally against the latest
+    snapshot, so many screeners share a single upstream request.
+    """
+
+    def __init__(self, interval=UNIVERSE_SNAPSHOT_INTERVAL, max_age=UNIVERSE_SNAPSHOT_MAX_AGE):
+        self.interval = interval
+        self.max_age = max_age
+        self.snapshot: Optional[Snapshot] = None
+        self.running = False
+        self.thread = None
+        self._refresh_lock = threading.RLock()
+        self.stats = {
+            'refreshes': 0,
+            'errors': 0,
+            'last_refresh_seconds': None
+        }
+
+    def refresh(self) -> Snapshot:
+        """Fetch the universe and swap in a new snapshot"""
+        with self._refresh_lock:
+            start = time.monotonic()
+            trv_query = Query().select(*Consts.COLUMNS_TO_RETRIEVE).order_by(
+                'market_cap_basic',
+                ascending=False
+            ).limit(int(1e6))
+            rows_matched, universe_df = fetch_scanner_data(trv_query)
+            symbol_resolver.record_tickers(universe_df['ticker'])
+
+            self.snapshot = Snapshot(
+                df=_compact(universe_df),
+                taken_at=time.monotonic(),
+                taken_at_utc=datetime.utcnow(),
+                rows_matched=rows_matched
+            )
+            self.stats['refreshes'] += 1
+            self.stats['last_refresh_seconds'] = round(time.monotonic() - start, 3)
+            print(f"🌐 Universe snapshot refreshed: {len(universe_df)} rows in {self.stats['last_refresh_seconds']}s")
+            return self.snapshot
+
+    def get_fresh(self, max_age: float = None) -> Optional[Snapshot]:
+        """
+        Return a snapshot no older than max_age, refreshing it on demand
+
+        Returns:
+            Snapshot, or None if no fresh snapshot could be taken
+        """
+        max_age = self.max_age if max_age is None else max_age
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.age <= max_age:
+            return snapshot
+
+        with self._refresh_lock:
+            # Another thread may have refreshed while we waited for the lock
+            snapshot = self.snapshot
+            if snapshot is not None and snapshot.age <= max_age:
+                return snapshot
+            try:
+                return self.refresh()
+            except Exception as e:
+                print(f"❌ Error refreshing universe snapshot: {e}")
+                self.stats['errors'] += 1
+                return None
+
+    def start(self):
+        """Start the background snapshot refresher thread"""
+        if self.running:
+            print("Universe snapshotter is already running")
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        print("✅ Universe snapshotter started")
+
+    def stop(self):
+        """Stop the background snapshot refresher thread"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+        print("✅ Universe snapshotter stopped")
+
+    def _run(self):
+        while self.running:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Error refreshing universe snapshot: {e}")
+                self.stats['errors'] += 1
+            time.sleep(self.interval)
+
+    def get_stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            **self.stats,
+            'running': self.running,
+            'interval': self.interval,
+            'max_age': self.max_age,
+            'rows': len(snapshot.df) if snapshot else 0,
+            'age_seconds': round(snapshot.age, 1) if snapshot else None,
+            'taken_at': snapshot.taken_at_utc.isoformat() if snapshot else None,
+            'memory_bytes': int(snapshot.df.memory_usage(deep=True).sum()) if snapshot else 0
+        }
+
+
+# Global universe snapshotter instance
+universe_snapshotter = UniverseSnapshotter()
@@ -0,0 +1,143 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from market_hours import (
+    CLOSED, MARKET_TZ, POST_MARKET, PRE_MARKET, REGULAR,
+    early_closes, market_holidays, market_now, market_session, next_session_change, session_times
+)
+
+# Extra phase for the first minutes of the regular session, when prices move fastest
+OPENING = 'opening'
+
+# Seconds between price update cycles, per phase
+SESSION_INTERVALS = {
+    PRE_MARKET: int(os.getenv('PRICE_UPDATE_INTERVAL_PRE', '120')),
+    OPENING: int(os.getenv('PRICE_UPDATE_INTERVAL_OPENING', '15')),
+    REGULAR: int(os.getenv('PRICE_UPDATE_INTERVAL_REGULAR', '30')),
+    POST_MARKET: int(os.getenv('PRICE_UPDATE_INTERVAL_POST', '120')),
+    CLOSED: int(os.getenv('PRICE_UPDATE_INTERVAL_CLOSED', '1800')),
+}
+OPENING_WINDOW_MINUTES = int(os.getenv('PRICE_UPDATE_OPENING_WINDOW', '15'))
+MIN_UPDATE_INTERVAL = 10  # seconds
+
+# Failed cycles back off exponentially, starting at the old fixed 60s
+ERROR_BACKOFF_BASE = int(os.getenv('PRICE_UPDATE_ERROR_BACKOFF', '60'))
+ERROR_BACKOFF_MAX = int(os.getenv('PRICE_UPDATE_ERROR_BACKOFF_MAX', '900'))
+
+
+class UpdateSchedule:
+    """
+    Decides how long the price updater waits between cycles.
+
+    The cadence follows the market phase: pre-market, opening, regular, post-market or
+    closed (nights, weekends, holidays). The period is measured from the start of one
+    cycle to the start of the next, so a slow fetch doesn't stretch it, and a wait never
+    runs past the next phase change. Failed cycles back off exponentially.
+    """
+
+    def __init__(self, intervals: Dict[str, int] = None, opening_window_minutes=OPENING_WINDOW_MINUTES,
+                 backoff_base=ERROR_BACKOFF_BASE, backoff_max=ERROR_BACKOFF_MAX):
+        self.intervals = {**SESSION_INTERVALS, **(intervals or {})}
+        self.opening_window = timedelta(minutes=opening_window_minutes)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.consecutive_errors = 0
+        self.overruns = 0
+        self.last_cycle_seconds = None
+        self.last_delay = None
+        self.next_run_at = None  # wall clock, for display
+
+    def phase(self, now: datetime = None) -> str:
+        """Market session, with the start of the regular session reported as OPENING"""
+        now = (now or market_now()).astimezone(MARKET_TZ)
+        session = market_session(now)
+        if session == REGULAR:
+            regular_open = datetime.combine(now.date(), session_times(now.date())[1], tzinfo=MARKET_TZ)
+            if now < regular_open + self.opening_window:
+                return OPENING
+        return session
+
+    def next_phase_change(self, now: datetime = None) -> datetime:
+        now = (now or market_now()).astimezone(MARKET_TZ)
+        if self.phase(now) == OPENING:
+            regular_open = datetime.combine(now.date(), session_times(now.date())[1], tzinfo=MARKET_TZ)
+            return regular_open + self.opening_window
+        return next_session_change(now)
+
+    def interval(self, now: datetime = None) -> int:
+        """Update period for the current phase"""
+        return self.intervals[self.phase(now)]
+
+    def set_interval(self, phase: str, seconds: int):
+        if phase not in self.intervals:
+            raise ValueError(f"Unknown market phase '{phase}', expected one of {list(self.intervals)}")
+        self.intervals[phase] = max(MIN_UPDATE_INTERVAL, int(seconds))
+
+    def next_delay(self, cycle_seconds: float, success: bool, now: datetime = None) -> float:
+        """
+        Seconds to wait before starting the next cycle
+
+        Args:
+            cycle_seconds: How long the cycle that just finished took
+            success: Whether it completed without errors
+            now: Current time, for testing
+        """
+        now = (now or market_now()).astimezone(MARKET_TZ)
+        self.last_cycle_seconds = cycle_seconds
+
+        delay = self.interval(now) - cycle_seconds
+        if delay < 0:
+            # Cycle took longer than the period: start the next one right away,
+            # without trying to catch up on the missed ones
+            self.overruns += 1
+            delay = 0
+
+        if success:
+            self.consecutive_errors = 0
+        else:
+            self.consecutive_errors += 1
+            backoff = min(self.backoff_base * 2 ** (self.consecutive_errors - 1), self.backoff_max)
+            delay = max(delay, backoff)
+
+        # Wake up at the phase change so a faster cadence starts on time
+        delay = min(delay, max(0.0, (self.next_phase_change(now) - now).total_seconds()))
+
+        self.last_delay = delay
+        self.next_run_at = now + timedelta(seconds=delay)
+        return delay
+
+    def get_stats(self, now: datetime = None) -> Dict:
+        now = (now or market_now()).astimezone(MARKET_TZ)
+        today = now.date()
+        return {
+            'phase': self.phase(now),
+            'interval': self.interval(now),
+            'intervals': dict(self.intervals),
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
+            'next_phase_change': self.next_phase_change(now).isoformat(),
+            'holiday': market_holidays(today.year).get(today),
+            'early_close': today in early_closes(today.year),
+            'last_cycle_seconds': round(self.last_cycle_seconds, 3) if self.last_cycle_seconds is not None else None,
+            'last_delay': round(self.last_delay, 3) if self.last_delay is not None else None,
+            'consecutive_errors': self.consecutive_errors,
+            'overruns': self.overruns
+        }
+
+
+# Simulate a trading day
+if __name__ == "__main__":
+    schedule = UpdateSchedule()
+    clock = datetime(2026, 11, 27, 3, 0, tzinfo=MARKET_TZ)  # Day after Thanksgiving, early close
+    end = clock + timedelta(days=1)
+    cycles = {}
+    start = time.perf_counter()
+    while clock < end:
+        phase = schedule.phase(clock)
+        cycles[phase] = cycles.get(phase, 0) + 1
+        cycle_seconds = 2.0
+        clock += timedelta(seconds=cycle_seconds)
+        clock += timedelta(seconds=schedule.next_delay(cycle_seconds, success=True, now=clock))
+    print(f"Cycles per phase on {end.date() - timedelta(days=1)}: {cycles} "
+          f"(fixed 30s would be {24 * 3600 // 30}), simulated in {time.perf_counter() - start:.2f}s")
@@ -1,10 +1,195 @@
 # Search All Fields AT || https://shner-elmo.github.io/TradingView-Screener/fields/stocks.html
+import sys
+import urllib.parse
+from functools import lru_cache
+
+import numpy as np
+
+from consts import Consts
+
+# Above this many pattern columns the full 2**k combination table gets too big,
+# so only the combinations that actually occur are labelled
+MAX_PATTERN_TABLE_BITS = 12
+
+# Screener exchange name -> TradingView symbol prefix, e.g. NYSE ARCA -> NYSEARCA
+TRADINGVIEW_EXCHANGES = {
+    **{exchange: exchange.replace(' ', '') for exchange in Consts.US_EXCHANGES},
+    'PHILADELPHIA STOCK EXCHANGE': 'PHLX',
+    'NATIONAL STOCK EXCHANGE': 'NSX',
+}
+TRADINGVIEW_SYMBOL_URL = 'https://www.tradingview.com/symbols/'
+TRADINGVIEW_LINK_SUFFIX = '/?utm_source=androidapp&utm_medium=share'
+# Characters urllib.parse.quote leaves untouched
+_URL_SAFE_PATTERN = r'[A-Za-z0-9_.\-~/]*'
+
+
+@lru_cache(maxsize=32)
+def _pattern_combination_table(candle_columns):
+    """
+    Build the interned label for every combination of pattern columns.
+
+    Args:
+        candle_columns: Tuple of pattern column names, bit j of a code stands for candle_columns[j]
+
+    Returns:
+        Object array where entry `code` holds the comma-joined names of the set bits
+    """
+    table = np.empty(1 << len(candle_columns), dtype=object)
+    for code in range(len(table)):
+        table[code] = sys.intern(', '.join(
+            col for j, col in enumerate(candle_columns) if code >> j & 1
+        ))
+    return table
+
+
+def label_candle_patterns(df, candle_columns):
+    """
+    Vectorized candlestick pattern labelling.
+
+    Each pattern column is folded into one bit of an integer code, so the work per row
+    is a handful of NumPy operations per column, and the label strings come from a
+    small table of interned combinations instead of being joined row by row.
+
+    Args:
+        df: DataFrame holding the pattern columns
+        candle_columns: Pattern column names in the order they should appear in the label
+
+    Returns:
+        Object array with one comma-separated pattern label per row
+    """
+    candle_columns = tuple(candle_columns)
+    if not candle_columns:
+        return np.full(len(df), '', dtype=object)
+
+    masks = df[list(candle_columns)].to_numpy(dtype=bool, na_value=False)
+    codes = np.zeros(len(df), dtype=np.int64)
+    for j in range(len(candle_columns)):
+        codes |= masks[:, j].astype(np.int64) << j
+
+    if len(candle_columns) <= MAX_PATTERN_TABLE_BITS:
+        return _pattern_combination_table(candle_columns)[codes]
+
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    labels = np.empty(len(unique_codes), dtype=object)
+    for i, code in enumerate(unique_codes):
+        labels[i] = sys.intern(', '.join(
+            col for j, col in enumerate(candle_columns) if int(code) >> j & 1
+        ))
+    return labels[inverse]
+
+
+def _tradingview_prefix(exchange):
+    """Link up to and including the URL-quoted 'EXCHANGE-' part"""
+    return TRADINGVIEW_SYMBOL_URL + urllib.parse.quote(f"{TRADINGVIEW_EXCHANGES.get(exchange, exchange)}-")
+
+
+def tradingview_links(df):
+    """
+    Vectorized mobile-friendly TradingView links, one per row.
+
+    Links have the form {TRADINGVIEW_SYMBOL_URL}EXCHANGE-SYMBOL{TRADINGVIEW_LINK_SUFFIX}.
+    The exchange prefix is mapped and URL-quoted once per distinct exchange through a
+    categorical, names are only quoted when they contain unsafe characters, and the
+    pieces are concatenated column-wise.
+
+    Args:
+        df: DataFrame with 'name' and 'exchange' columns
+
+    Returns:
+        Object array of link strings
+    """
+    exchanges = df['exchange'].astype('category')
+    prefixes = np.array([
+        _tradingview_prefix(e) for e in exchanges.cat.categories
+    ] + [None], dtype=object)
+    codes = exchanges.cat.codes.to_numpy()
+    exchange_prefixes = prefixes[codes]
+    # Missing exchanges (code -1) are formatted from the cell itself, as in the
+    # row-wise version, so None and NaN keep their 'None-' / 'nan-' prefixes
+    missing = codes == -1
+    if missing.any():
+        exchange_prefixes[missing] = [
+            _tradingview_prefix(e) for e in df['exchange'].to_numpy(dtype=object)[missing]
+        ]
+
+    names = df['name'].astype(str)
+    unsafe = ~names.str.fullmatch(_URL_SAFE_PATTERN)
+    if unsafe.any():
+        names = names.copy()
+        names[unsafe] = names[unsafe].map(urllib.parse.quote)
+
+    return exchange_prefixes + names.to_numpy(dtype=object) + TRADINGVIEW_LINK_SUFFIX
+
+
+def add_derived_columns(df):
+    """Add the SMA20/Close, ATR% and ADR% ratio columns"""
+    df['SMA20/Close'] = df['SMA20'] / df['close']
+    df['ATR%'] = df['ATR'] / df['close'] * 100
+    df['ADR%'] = df['ADR'] / df['close'] * 100
+    return df
+
 
 def clean_candle_columns(df):
     candle_columns = list(filter(lambda x: x.startswith('Candle.'), df.columns))
 
-    df['candlestick_pattern'] = df[candle_columns].apply(
-        lambda row: ', '.join([col for col in candle_columns if row[col]]), axis=1
-    )
+    df['candlestick_pattern'] = label_candle_patterns(df, candle_columns)
+
+    return df
+
+
+# Benchmark against the previous row-wise implementations
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+
+    def clean_candle_columns_rowwise(df):
+        candle_columns = list(filter(lambda x: x.startswith('Candle.'), df.columns))
+        df['candlestick_pattern'] = df[candle_columns].apply(
+            lambda row: ', '.join([col for col in candle_columns if row[col]]), axis=1
+        )
+        return df
+
+    pattern_columns = ['Candle.Hammer', 'Candle.Engulfing.Bullish', 'Candle.Doji', 'Candle.Marubozu.White']
+    rng = np.random.default_rng(0)
+
+    for rows in (1_000, 10_000, 100_000):
+        bench_df = pd.DataFrame(rng.random((rows, len(pattern_columns))) < 0.1, columns=pattern_columns).astype(int)
+
+        start = time.perf_counter()
+        expected = clean_candle_columns_rowwise(bench_df.copy())['candlestick_pattern']
+        rowwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = clean_candle_columns(bench_df.copy())['candlestick_pattern']
+        vectorized_time = time.perf_counter() - start
+
+        assert (expected.to_numpy() == actual.to_numpy()).all()
+        print(f"{rows:>7} rows: row-wise {rowwise_time * 1000:9.2f} ms | "
+              f"vectorized {vectorized_time * 1000:7.2f} ms | "
+              f"speedup x{rowwise_time / vectorized_time:.0f}")
+
+    def tradingview_link_rowwise(row):
+        tv_exchange = TRADINGVIEW_EXCHANGES.get(row['exchange'], row['exchange'])
+        encoded_symbol = urllib.parse.quote(f"{tv_exchange}-{row['name']}")
+        return f"{TRADINGVIEW_SYMBOL_URL}{encoded_symbol}{TRADINGVIEW_LINK_SUFFIX}"
+
+    for rows in (1_000, 10_000, 100_000):
+        exchanges = rng.choice(Consts.US_EXCHANGES + ['LSE', None], rows)
+        exchanges[::97] = None
+        bench_df = pd.DataFrame({
+            'name': [f"SYM{i}" if i % 500 else f"BRK.{i}/A&B" for i in range(rows)],
+            'exchange': exchanges,
+        })
+
+        start = time.perf_counter()
+        expected = bench_df.apply(tradingview_link_rowwise, axis=1)
+        rowwise_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = tradingview_links(bench_df)
+        vectorized_time = time.perf_counter() - start
 
-    return df
\ No newline at end of file
+        assert (expected.to_numpy() == actual).all()
+        print(f"{rows:>7} links: row-wise {rowwise_time * 1000:9.2f} ms | "
+              f"vectorized {vectorized_time * 1000:7.2f} ms | "
+              f"speedup x{rowwise_time / vectorized_time:.0f}")
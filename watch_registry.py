@@ -0,0 +1,173 @@
+import os
+import threading
+from typing import Dict, FrozenSet, Iterable, List
+
+from consts import Consts
+
+# Persisted references of a price stream expire this long after their last renewal,
+# in case the process serving the stream dies without removing them
+STREAM_REF_TTL = float(os.getenv('STREAM_REF_TTL', '120'))  # seconds
+
+
+def screener_symbols(params) -> List[str]:
+    """Symbols a screener's params['symbols'] pins, as a comma-separated string or a list"""
+    symbols = (params or {}).get('symbols') if isinstance(params, dict) else None
+    if isinstance(symbols, str):
+        return [s.strip().upper() for s in symbols.split(',') if s.strip()]
+    if isinstance(symbols, list):
+        return [s.upper() for s in symbols if s]
+    return []
+
+
+def watch_key(kind: str, doc_id) -> str:
+    """Registry key of one trade, watchlist item or screener, e.g. 'trade:64f0...'"""
+    return f"{kind}:{doc_id}"
+
+
+class WatchRegistry:
+    """
+    Reference-counted set of symbols the price updater keeps fresh.
+
+    Every trade, watchlist item and screener that names symbols holds one reference per
+    symbol under its own key. References are updated as those documents are saved,
+    updated or deleted, and persisted through the storage manager (one small document
+    per key), so a restart loads them with a single query instead of rescanning every
+    collection. The watched set is kept materialized, so reading it is O(1).
+    """
+
+    def __init__(self, storage, default_symbols: Iterable[str] = Consts.DEFAULT_WATCHED_SYMBOLS):
+        self.storage = storage
+        self.default_symbols = [s.upper() for s in default_symbols]
+        self._refs: Dict[str, tuple] = {}  # key -> symbols it references
+        self._counts: Dict[str, int] = {}  # symbol -> number of references
+        self._symbols: FrozenSet[str] = frozenset()
+        self._ephemeral = {'defaults'}  # keys that are never persisted
+        self._version = None  # storage version the references were loaded at
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.stats = {
+            'loaded_refs': 0,
+            'rebuilt_from_collections': False,
+            'updates': 0,
+            'reloads': 0
+        }
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._version = self.storage.get_watch_refs_version()
+            refs = self.storage.get_watch_refs()
+            if not refs:
+                # First start with the registry: build it once from the source collections
+                refs = self.storage.scan_watch_refs()
+                if refs:
+                    self.storage.save_watch_refs(refs)
+                    self.stats['rebuilt_from_collections'] = True
+            for key, symbols in refs.items():
+                self._add(key, symbols)
+            self._add('defaults', self.default_symbols)
+            self.stats['loaded_refs'] = len(refs)
+            self._symbols = frozenset(self._counts)
+            self._loaded = True
+
+    def refresh(self):
+        """Reload persisted references if another process changed them since they were loaded"""
+        if not self._loaded:
+            self._ensure_loaded()
+            return
+        version = self.storage.get_watch_refs_version()
+        if version is None or version == self._version:
+            return
+        refs = self.storage.get_watch_refs()
+        with self._lock:
+            ephemeral = {key: self._refs[key] for key in self._ephemeral if key in self._refs}
+            self._refs, self._counts = {}, {}
+            for key, symbols in {**refs, **ephemeral}.items():
+                self._add(key, symbols)
+            self._symbols = frozenset(self._counts)
+            self._version = version
+            self.stats['reloads'] += 1
+
+    def _add(self, key: str, symbols: Iterable[str]) -> bool:
+        """Register key's references, returning whether a new symbol became watched"""
+        symbols = tuple(sorted({s.upper() for s in symbols if s}))
+        self._refs[key] = symbols
+        added = False
+        for symbol in symbols:
+            count = self._counts.get(symbol, 0)
+            self._counts[symbol] = count + 1
+            added = added or count == 0
+        return added
+
+    def _remove(self, key: str) -> bool:
+        """Drop key's references, returning whether a symbol stopped being watched"""
+        removed = False
+        for symbol in self._refs.pop(key, ()):
+            count = self._counts[symbol] - 1
+            if count:
+                self._counts[symbol] = count
+            else:
+                del self._counts[symbol]
+                removed = True
+        return removed
+
+    def set_refs(self, key: str, symbols: Iterable[str], persist: bool = True, ttl: float = None):
+        """
+        Replace the symbols referenced by key, on save or update
+
+        Args:
+            key: watch_key() of the referencing document
+            symbols: Symbols it references, empty to drop its references
+            persist: False for references only this process needs to know about
+            ttl: Seconds the persisted references live unless set again, e.g. for connected
+                price streams, None to keep them until removed
+        """
+        self._ensure_loaded()
+        symbols = [s for s in symbols if s]
+        with self._lock:
+            if not persist:
+                self._ephemeral.add(key)
+            changed = self._remove(key)
+            if symbols:
+                changed = self._add(key, symbols) or changed
+            if changed:
+                self._symbols = frozenset(self._counts)
+            self.stats['updates'] += 1
+            persisted = self._refs.get(key)
+        if not persist:
+            return
+        if persisted:
+            self.storage.save_watch_refs({key: persisted}, ttl=ttl)
+        else:
+            self.storage.delete_watch_ref(key)
+
+    def remove_refs(self, key: str, persist: bool = True):
+        """Drop all references held by key, on delete"""
+        self._ensure_loaded()
+        with self._lock:
+            self._ephemeral.discard(key)
+            if self._remove(key):
+                self._symbols = frozenset(self._counts)
+            self.stats['updates'] += 1
+        if persist:
+            self.storage.delete_watch_ref(key)
+
+    def symbols(self) -> FrozenSet[str]:
+        """The currently watched symbols"""
+        self._ensure_loaded()
+        return self._symbols
+
+    def ref_count(self, symbol: str) -> int:
+        self._ensure_loaded()
+        return self._counts.get(symbol.upper(), 0)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'loaded': self._loaded,
+            'keys': len(self._refs),
+            'symbols': len(self._symbols)
+        }